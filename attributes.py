@@ -16,10 +16,12 @@ class Attributes(TypedDict):
     timeout: float
     include: str
     code: str
-    expected_input: str
-    expected_output: str
+    input_file: str
+    output_file: str
+    script_file: str
     script_content: str
     approved_includes: List[str]
     skip: bool
     script_args: str
     visibility: str
+    compare: str
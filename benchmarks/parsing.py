@@ -0,0 +1,138 @@
+'''
+Benchmark for parsing test specifications.
+
+Parses synthetic specifications of increasing size and reports the time per test, which should
+stay flat as the specification grows.
+
+usage: python3 benchmarks/parsing.py [--tests N] [--repeat R]
+'''
+
+from argparse import ArgumentParser, Namespace
+from os import chdir, getcwd, makedirs
+from os.path import abspath, dirname, join as path_join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import sys
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+# pylint: disable-next=wrong-import-position
+from test_parsing import parse_tests
+
+UNIT_TEST = '''/*
+@number: {number}
+@name: unit test {number}
+@points: 1
+@type: unit
+@target: code.cpp
+*/
+<test>
+    Vector<int> v;
+    for (int i = 0; i < {number}; i++) {{
+        v.push_back(i);
+    }}
+
+    EXPECT_EQ(v.size(), {number});
+</test>
+
+'''
+
+IO_TEST = '''/*
+@number: {number}
+@name: i/o test {number}
+@points: 1
+@type: i/o
+@target: code_interactive.cpp
+*/
+<test>
+    input: io/input.txt
+    output: io/output.txt
+</test>
+
+'''
+
+SCRIPT_TEST = '''/*
+@number: {number}
+@name: script test {number}
+@points: 1
+@type: script
+*/
+<test>
+    scripts/example.sh --verbose
+</test>
+
+'''
+
+COMPILE_TEST = '''/*
+@number: {number}
+@name: compile test {number}
+@points: 1
+@type: compile
+*/
+<test>
+    code.cpp
+    code_tests.cpp
+</test>
+
+'''
+
+TEMPLATES = (UNIT_TEST, UNIT_TEST, IO_TEST, SCRIPT_TEST, COMPILE_TEST)
+
+def write_spec(filename: str, num_tests: int) -> None:
+    '''
+    write a specification with the given number of tests.
+    '''
+    with open(filename, 'wt', encoding='utf-8') as file:
+        for index in range(num_tests):
+            file.write(TEMPLATES[index % len(TEMPLATES)].format(number=index + 1))
+
+def write_fixtures() -> None:
+    '''
+    write the files that the specification refers to.
+    '''
+    makedirs('io', exist_ok=True)
+    makedirs('scripts', exist_ok=True)
+    for filename in ('io/input.txt', 'io/output.txt', 'scripts/example.sh'):
+        with open(filename, 'wt', encoding='utf-8') as file:
+            file.write('example\n')
+
+def time_parse(filename: str, repeat: int) -> float:
+    '''
+    best time (in seconds) to parse a specification.
+    '''
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        parse_tests(filename)
+        best = min(best, perf_counter() - start)
+    return best
+
+def get_command_line_args() -> Namespace:
+    '''
+    parse command line arguments.
+    '''
+    parser = ArgumentParser(description='benchmark the test specification parser')
+    parser.add_argument('--tests', type=int, default=50000, help='size of the largest specification [default=50000]')
+    parser.add_argument('--repeat', type=int, default=3, help='parses per size (the best is reported) [default=3]')
+    return parser.parse_args()
+
+def main(args: Namespace) -> None:
+    '''
+    parse specifications of 1/8, 1/4, 1/2, and all of the given size.
+    '''
+    cwd = getcwd()
+    with TemporaryDirectory() as directory:
+        chdir(directory)
+        try:
+            write_fixtures()
+            print(f'{"tests":>8} {"seconds":>10} {"µs/test":>10}')
+            for num_tests in (args.tests // 8, args.tests // 4, args.tests // 2, args.tests):
+                filename = path_join(directory, f'{num_tests}.tests')
+                write_spec(filename, num_tests)
+                seconds = time_parse(filename, args.repeat)
+                print(f'{num_tests:>8} {seconds:>10.3f} {seconds / num_tests * 1e6:>10.1f}')
+        finally:
+            chdir(cwd)
+
+if __name__ == '__main__':
+    main(get_command_line_args())
@@ -0,0 +1,272 @@
+'''
+A content-addressed cache of compiler results, shared across tests and submissions.
+
+An entry is keyed by a hash of the compiler, the compile command, and the contents of every input
+file.  It stores whether the compile succeeded, what the compiler printed, and the artifacts it
+produced, so a hit restores all of that without invoking the compiler.
+
+The total size of the entries is kept in an index file (updated under a lock, since the cache can be
+shared by concurrent runs), so a miss only has to look at the whole cache when it goes over its bound.
+
+Within a run, the program of every i/o test with the same sources is compiled once (see compile_once).
+'''
+
+from fcntl import LOCK_EX, flock
+from hashlib import sha256
+from os import listdir, makedirs, rename, utime, walk
+from os.path import dirname, exists as path_exists, getmtime, getsize, isdir, join as path_join
+from shutil import copy2, rmtree
+import json
+import subprocess
+from typing import IO, Callable, Dict, List, Tuple
+
+from config import COMPILE_CACHE_DIR, COMPILE_CACHE_EVICT_TO, COMPILE_CACHE_MAX_BYTES
+
+CACHE_CONFIG: Dict[str, str | int] = {
+    'directory': COMPILE_CACHE_DIR,
+    'max_bytes': COMPILE_CACHE_MAX_BYTES
+}
+
+CACHE_STATS: Dict[str, int] = {
+    'hits': 0,
+    'misses': 0
+}
+
+# (path, size, mtime) -> content hash, so unchanged files are only hashed once
+FILE_HASHES: Dict[Tuple[str, int, float], str] = {}
+
+# compiler version command -> version output
+COMPILER_IDENTITIES: Dict[str, str] = {}
+
+# file in the cache directory that holds the total size of its entries
+SIZE_INDEX = 'size'
+
+# compiles of the programs that i/o tests run, keyed by sources, as (compiles, output)
+PROGRAM_COMPILES: Dict[Tuple[str, ...], Tuple[bool, str]] = {}
+
+def configure_compile_cache(directory: str, max_bytes: int = COMPILE_CACHE_MAX_BYTES) -> None:
+    '''
+    enable the cache in the given directory (or disable it, if directory is empty).
+    '''
+    CACHE_CONFIG['directory'] = directory
+    CACHE_CONFIG['max_bytes'] = max_bytes
+
+def compile_cache_enabled() -> bool:
+    '''
+    return true if compile results are being cached.
+    '''
+    return bool(CACHE_CONFIG['directory'])
+
+def reset_compile_cache_stats() -> None:
+    '''
+    forget the hit/miss counts so far.
+    '''
+    CACHE_STATS['hits'] = 0
+    CACHE_STATS['misses'] = 0
+
+def merge_compile_cache_stats(stats: Dict[str, int]) -> None:
+    '''
+    add hit/miss counts collected elsewhere (e.g. in a worker process).
+    '''
+    CACHE_STATS['hits'] += stats['hits']
+    CACHE_STATS['misses'] += stats['misses']
+
+def file_hash(filename: str) -> str:
+    '''
+    hash the contents of a file.
+    '''
+    signature = (filename, getsize(filename), getmtime(filename))
+    if signature not in FILE_HASHES:
+        digest = sha256()
+        with open(filename, 'rb') as file:
+            for chunk in iter(lambda: file.read(1 << 16), b''):
+                digest.update(chunk)
+        FILE_HASHES[signature] = digest.hexdigest()
+    return FILE_HASHES[signature]
+
+def compiler_identity(version_cmd: List[str]) -> str:
+    '''
+    describe the compiler (by its version output), so that changing compilers invalidates entries.
+    '''
+    key = ' '.join(version_cmd)
+    if key not in COMPILER_IDENTITIES:
+        try:
+            result = subprocess.run(version_cmd, capture_output=True, text=True, check=False)
+            COMPILER_IDENTITIES[key] = result.stdout + result.stderr
+        except OSError as err:
+            COMPILER_IDENTITIES[key] = str(err)
+    return COMPILER_IDENTITIES[key]
+
+def cache_key(command: str, version_cmd: List[str], inputs: List[str]) -> str:
+    '''
+    hash everything that can change the result of a compile.
+    '''
+    digest = sha256()
+    digest.update(compiler_identity(version_cmd).encode('utf-8'))
+    digest.update(b'\0' + command.encode('utf-8'))
+    for filename in sorted(set(inputs)):
+        digest.update(b'\0' + filename.encode('utf-8'))
+        digest.update(b'\0' + (file_hash(filename) if path_exists(filename) else '-').encode('utf-8'))
+    return digest.hexdigest()
+
+def restore_entry(entry: str) -> Tuple[bool, str] | None:
+    '''
+    copy the artifacts of a cache entry into the current directory.
+    returns None if there is no (complete) entry.
+    '''
+    try:
+        with open(path_join(entry, 'meta.json'), 'r', encoding='utf-8') as file:
+            meta = json.load(file)
+        for artifact in meta['artifacts']:
+            if dirname(artifact):
+                makedirs(dirname(artifact), exist_ok=True)
+            copy2(path_join(entry, 'files', artifact), artifact)
+    except (OSError, ValueError, KeyError):
+        return None
+    # mark as recently used
+    utime(entry)
+    return meta['compiles'], meta['output']
+
+def store_entry(entry: str, compiles: bool, output: str, artifacts: List[str]) -> int:
+    '''
+    save the result of a compile as a cache entry.
+    returns the size of the entry, or 0 if it wasn't stored.
+    '''
+    staging = f'{entry}.tmp'
+    try:
+        rmtree(staging, ignore_errors=True)
+        for artifact in artifacts:
+            destination = path_join(staging, 'files', artifact)
+            makedirs(dirname(destination), exist_ok=True)
+            copy2(artifact, destination)
+        makedirs(staging, exist_ok=True)
+        with open(path_join(staging, 'meta.json'), 'wt', encoding='utf-8') as file:
+            json.dump({'compiles': compiles, 'output': output, 'artifacts': artifacts}, file)
+        size = entry_size(staging)
+        rename(staging, entry)
+    except OSError:
+        # someone else stored it first, or the cache is not writable: either way, not fatal
+        rmtree(staging, ignore_errors=True)
+        return 0
+    return size
+
+def entry_size(entry: str) -> int:
+    '''
+    total size of the files in a cache entry.
+    '''
+    size = 0
+    for root, _, files in walk(entry):
+        for filename in files:
+            size += getsize(path_join(root, filename))
+    return size
+
+def evict_entries(directory: str) -> int:
+    '''
+    remove least recently used entries until the cache fits in its size bound (with room to spare).
+    returns the size of what is left.
+    '''
+    target = int(CACHE_CONFIG['max_bytes']) * COMPILE_CACHE_EVICT_TO
+    entries = []
+    for name in listdir(directory):
+        entry = path_join(directory, name)
+        if isdir(entry) and not name.endswith('.tmp'):
+            entries.append((getmtime(entry), entry_size(entry), entry))
+    total = sum(size for _, size, _ in entries)
+    if total <= int(CACHE_CONFIG['max_bytes']):
+        return total
+    for _, size, entry in sorted(entries):
+        if total <= target:
+            break
+        rmtree(entry, ignore_errors=True)
+        total -= size
+    return total
+
+def read_size_index(index: IO[str]) -> int | None:
+    '''
+    the total size in the index, or None if it can't be read.
+    '''
+    index.seek(0)
+    try:
+        return int(index.read())
+    except ValueError:
+        return None
+
+def add_to_cache_size(size: int) -> None:
+    '''
+    count a new entry in the total size of the cache, and evict entries if it is now over its bound.
+    '''
+    directory = str(CACHE_CONFIG['directory'])
+    try:
+        with open(path_join(directory, SIZE_INDEX), 'a+', encoding='utf-8') as index:
+            flock(index, LOCK_EX)
+            total = read_size_index(index)
+            if total is None or total + size > int(CACHE_CONFIG['max_bytes']):
+                # (the whole cache is looked at, so the total is exact again)
+                total = evict_entries(directory)
+            else:
+                total += size
+            index.seek(0)
+            index.truncate()
+            index.write(str(total))
+    except OSError:
+        # the cache is not writable, so it isn't growing either
+        pass
+
+def cached_compile(
+        command: str,
+        version_cmd: List[str],
+        inputs: List[str],
+        compile_fn: Callable[[], Tuple[bool, str]],
+        artifacts_fn: Callable[[], List[str]]) -> Tuple[bool, str]:
+    '''
+    compile with compile_fn, unless an identical compile is already cached.
+
+    Args:
+        command (str): the compile command (including flags and output names)
+        version_cmd (List[str]): command that prints the version of the compiler
+        inputs (List[str]): every file that the compile reads
+        compile_fn (Callable[[], Tuple[bool, str]]): does the compile, returns (compiles, output)
+        artifacts_fn (Callable[[], List[str]]): lists the files produced by the compile
+
+    Returns:
+        Tuple[bool, str]: compiles, compiler output
+    '''
+    if not compile_cache_enabled():
+        return compile_fn()
+
+    directory = str(CACHE_CONFIG['directory'])
+    makedirs(directory, exist_ok=True)
+    entry = path_join(directory, cache_key(command, version_cmd, inputs))
+
+    restored = restore_entry(entry)
+    if restored is not None:
+        CACHE_STATS['hits'] += 1
+        return restored
+
+    CACHE_STATS['misses'] += 1
+    compiles, output = compile_fn()
+    size = store_entry(entry, compiles, output, artifacts_fn() if compiles else [])
+    if size:
+        add_to_cache_size(size)
+    return compiles, output
+
+def compile_once(
+        src: List[str],
+        compile_fn: Callable[[List[str]], Tuple[bool, str]],
+        artifact: str) -> Tuple[bool, str]:
+    '''
+    compile the program that an i/o test runs with compile_fn, unless the same sources were already
+    compiled (for another i/o test) and what that made is still there.
+
+    Args:
+        src (List[str]): the sources (each may be a space-separated list)
+        compile_fn (Callable[[List[str]], Tuple[bool, str]]): compiles the sources, returns (compiles, output)
+        artifact (str): a file that a successful compile makes (e.g. the executable)
+
+    Returns:
+        Tuple[bool, str]: compiles, compiler output
+    '''
+    key = tuple(' '.join(src).split())
+    if key not in PROGRAM_COMPILES or (PROGRAM_COMPILES[key][0] and not path_exists(artifact)):
+        PROGRAM_COMPILES[key] = compile_fn(src)
+    return PROGRAM_COMPILES[key]
@@ -30,6 +30,9 @@ DEFAULT_NUMBER = ''
 DEFAULT_TARGET = ''
 DEFAULT_VISIBILITY = VISIBLE
 DEFAULT_STDOUT_VISIBILITY = VISIBLE
+# how i/o test output is compared with the expected output (see output_comparison.py)
+DEFAULT_COMPARE = 'exact'
+DEFAULT_FLOAT_TOLERANCE = 1e-6
 
 # output
 TIMEOUT_MSSG = 'Timeout during test execution\n'
@@ -40,11 +43,78 @@ INFO_UNSUPPORTED_TEST = '[INFO] Unsupported Test'
 # snarky comment control
 SNARKY_SUBMISSION_SCORE_THRESHHOLD = 0.9  # be snarky when score < 90%
 
+# environment variable that holds the id of a worker process, when running tests in parallel
+WORKER_ID_VARIABLE = 'AUTOGRADER_WORKER_ID'
+# files in the testbox at least this large (fixtures, built artifacts) are hard-linked into the
+# sandboxes of parallel workers rather than copied, since tests only read them
+SANDBOX_LINK_BYTES = 64 * 1024
+
+# where to cache parsed test specifications across runs (an empty directory disables the cache)
+TEST_PLAN_CACHE_DIR = ''
+
+# a test is killed once it prints more than this many bytes (to stdout or to stderr),
+# and only the first and last half of that is kept
+MAX_OUTPUT_BYTES = 64 * 1024 * 1024
+
+# i/o tests stop at the first line that differs from the expected output,
+# and report it after this many of the lines before it
+IO_STOP_AT_FIRST_DIFFERENCE = True
+IO_DIFF_CONTEXT_LINES = 3
+
+# the input and output shown to students are cut short after this many bytes
+IO_MESSAGE_EXCERPT_BYTES = 4096
+
+# memory for the line hashes of expected outputs (an expected output with more lines than fit is
+# compared without them)
+IO_LINE_INDEX_CACHE_BYTES = 64 * 1024 * 1024
+# expected outputs are read (to hash their lines) in blocks of about this many bytes
+IO_LINE_BLOCK_BYTES = 1024 * 1024
+
+# largest i/o fixture (input or output file) that a test specification may reference
+MAX_FIXTURE_BYTES = 256 * 1024 * 1024
+
+# compile cache config (an empty directory disables the cache)
+COMPILE_CACHE_DIR = ''
+COMPILE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# eviction goes down to this fraction of the bound, so a full cache isn't looked at again on every miss
+COMPILE_CACHE_EVICT_TO = 0.9
+
 # cpp compilation config
 CXX = 'g++'
 CXX_FLAGS = '-std=c++23 -g'
+# must match the flags in memory_errors.sh
+CXX_MEMORY_ERRORS_FLAGS = '-std=c++23 -pedantic-errors -g'
+# compile all unit tests into one executable (falls back to one executable per test)
+CXX_BATCH_UNIT_TESTS = True
+# precompile the headers included by unit and performance tests (falls back to including them)
+CXX_PRECOMPILED_HEADERS = True
+# only precompile a header that at least this many compiles include (a batch of unit tests is one compile),
+# since building it takes longer than a few compiles save
+CXX_PRECOMPILED_HEADER_MIN_COMPILES = 4
 
 # java compilation config
 JAVA_CLASSPATH = ".:./lib/hamcrest-2.2.jar:./lib/junit-4.13.2.jar"
 JAVAC = 'javac'
-JAVA_FLAGS = '-Xlint -g -cp ' + JAVA_CLASSPATH
\ No newline at end of file
+JAVA_FLAGS = '-Xlint -g -cp ' + JAVA_CLASSPATH
+# compile all unit tests with one javac (bisected to find the tests that don't compile)
+JAVA_BATCH_UNIT_TESTS = True
+# run unit, performance, and i/o tests in one long-lived JVM (see TestServer.java),
+# instead of starting a JVM for every test (falls back to one JVM per test)
+JAVA_TEST_SERVER = False
+
+# sql config
+# where sql tests run: 'mysql', or 'sqlite' (in memory, no server needed). a test can choose
+# with "backend : <name>"; tests that check mysql's catalog or error codes always run on mysql.
+SQL_BACKEND = 'mysql'
+SQL_HOST = '127.0.0.1'
+SQL_USER = 'root'
+SQL_PASSWORD = ''
+SQL_START_COMMAND = ['service', 'mysql', 'start']
+# how long to wait for the database server to accept connections
+SQL_STARTUP_TIMEOUT = 30.0
+# how many idle connections to keep for reuse
+SQL_POOL_SIZE = 4
+# the most rows to insert at once when loading setup scripts
+SQL_BULK_INSERT_ROWS = 1000
+# where to keep the results of solution scripts between runs (an empty directory keeps them in memory only)
+SQL_SOLUTION_CACHE_DIR = ''
@@ -0,0 +1,17 @@
+'''
+Writing the files that tests read (e.g. the input of an i/o test, or a script) into the testbox.
+
+Fixtures can be large (up to MAX_FIXTURE_BYTES), so they are copied a chunk at a time, and are never
+held in memory. Text is copied as is: bytes that aren't utf-8 are kept, not replaced.
+'''
+
+from shutil import copyfileobj
+
+def copy_text_file(source: str, destination: str, suffix: str = '') -> None:
+    '''
+    copy a text file, with suffix (e.g. a newline) after its contents.
+    '''
+    with open(source, 'rt', encoding='utf-8', errors='surrogateescape') as file, \
+            open(destination, 'wt', encoding='utf-8', errors='surrogateescape') as f:
+        copyfileobj(file, f)
+        f.write(suffix)
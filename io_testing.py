@@ -0,0 +1,99 @@
+'''
+Running i/o tests, the same way for every language.
+
+The program's input streams straight from input.txt, and its output is compared with the expected
+output (as @compare says, see output_comparison.py) as it is printed. The student is shown the start
+of the input, and either the start of their output (if it passed) or where it first differs from the
+expected output. Each language only says how to run its program.
+'''
+
+from typing import Callable, List, Optional, Tuple
+
+from config import IO_STOP_AT_FIRST_DIFFERENCE, TIMEOUT_MSSG
+from output_comparison import LineComparator, OutputComparator, excerpt, file_excerpt, make_comparator, parse_comparison
+from process_control import ProcessResult, io_output_limit, run_process
+
+# the input of every i/o test (written by write_io_test)
+IO_INPUT_FILE = 'input.txt'
+
+def run_with_input(
+        run_cmd: List[str],
+        input_file: str,
+        timeout: float,
+        max_output: int,
+        on_stdout: Optional[Callable[[bytes], bool]] = None) -> ProcessResult:
+    '''
+    run a program (in a process of its own) with its input streamed from input_file.
+    '''
+    with open(input_file, 'rb') as stdin:
+        return run_process(run_cmd, timeout, stdin, max_output=max_output, on_stdout=on_stdout)
+
+def io_comparator(compare: str, output_file: str, stop_at_mismatch: bool, normalize_exact: bool) -> OutputComparator:
+    '''
+    the comparator for a @compare value, where 'exact' only ignores trailing whitespace with normalize_exact.
+    '''
+    if not normalize_exact and parse_comparison(compare)[0] == 'exact':
+        return LineComparator(output_file, stop_at_mismatch=stop_at_mismatch, normalize=False)
+    return make_comparator(compare, output_file, stop_at_mismatch)
+
+def run_io_test(
+        timeout: float,
+        run_cmd: List[str],
+        output_file: str,
+        compare: str,
+        run: Callable[..., ProcessResult] = run_with_input,
+        normalize_exact: bool = True,
+        check_exit_status: bool = False) -> Tuple[bool,str]:
+    '''
+    run an i/o test.
+
+    Args:
+        timeout (float): how long to wait before test times out
+        run_cmd (List[str]): command that runs the program under test
+        output_file (str): file that holds the expected output
+        compare (str): how the output is compared with the expected output (@compare)
+        run (Callable[..., ProcessResult]): runs the command, with the same arguments as run_with_input
+        normalize_exact (bool): whether 'exact' ignores trailing whitespace (and \\r)
+        check_exit_status (bool): whether the program fails if it exits with a non-zero status
+            (its output is then compared to the end, so it isn't stopped at the first difference)
+
+    Returns:
+        Tuple[bool,str]: passed, message to the student
+    '''
+    message_to_student = ""
+    passed = False
+    stop_at_mismatch = IO_STOP_AT_FIRST_DIFFERENCE and not check_exit_status
+
+    try:
+        with io_comparator(compare, output_file, stop_at_mismatch, normalize_exact) as comparator:
+            result = run(
+                run_cmd,
+                input_file=IO_INPUT_FILE,
+                timeout=timeout,
+                max_output=io_output_limit(output_file),
+                on_stdout=comparator.feed)
+            if result.timed_out:
+                return False, TIMEOUT_MSSG + result.kill_reason
+            passed = comparator.finish()
+
+        if check_exit_status and result.returncode != 0:
+            message_to_student += result.stdout.decode(encoding = 'utf-8', errors = 'backslashreplace') + '\n'
+            message_to_student += result.stderr.decode(encoding = 'utf-8', errors = 'backslashreplace')
+            if result.returncode != 1:
+                message_to_student += '\n' + f"Program exited with status {result.returncode}."
+            return False, message_to_student
+
+        message_to_student += f"The input:\n{file_excerpt(IO_INPUT_FILE)}\n\n"
+        if passed:
+            message_to_student += f"Your output:\n{excerpt(result.stdout)}\n\n"
+        else:
+            message_to_student += comparator.describe_mismatch()
+            if result.kill_reason:
+                message_to_student += f"(your program was {result.kill_reason.rstrip()})\n\n"
+
+    except Exception as e:
+        output_str = str(e)
+        message_to_student += output_str
+        passed = False
+
+    return passed, message_to_student
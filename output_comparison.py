@@ -0,0 +1,677 @@
+'''
+Comparing the output of i/o tests with the expected output, as the output is produced.
+
+The output and the expected output are compared line by line, so neither is held in memory in full,
+and a test can be stopped at the first line that differs. A line that is missing (because one side
+ended first) compares as an empty line, which is what makes trailing blank lines not matter.
+
+How lines compare is chosen per test with @compare (see COMPARATORS at the bottom of this file):
+  'exact'         the lines are the same (apart from trailing whitespace)
+  'tokens'        the (whitespace-separated) tokens are the same, however they are split into lines
+  'float[:tol]'   as tokens, but numbers only have to be within tol (default 1e-6) of each other
+  'unordered'     the (non-blank) lines are the same, in any order
+  'regex'         every line of output fully matches the regular expression on its expected line
+
+Expected outputs are memory-mapped, and output that is the same as the expected output byte for
+byte (the usual case for a passing test) is compared as bytes, without being decoded or split into
+lines. From the first byte that differs, the output is compared line by line with an index of the
+hashes of the expected lines, which is built once per expected output (and process). Line hashes
+are Python's string hashes, which are keyed per process, so the chance that a wrong line passes is
+about 1 in 2^64. The expected output is only decoded again to show the lines around a difference.
+'''
+
+from array import array
+from codecs import getincrementaldecoder
+from collections import Counter, OrderedDict
+from itertools import islice
+from math import isclose, isfinite
+from mmap import ACCESS_READ, mmap
+from os import stat
+from os.path import abspath
+import re
+from types import TracebackType
+from typing import Dict, Generator, Iterator, List, Optional, Pattern, Sequence, Tuple, Type
+
+from config import DEFAULT_FLOAT_TOLERANCE, IO_DIFF_CONTEXT_LINES, IO_LINE_BLOCK_BYTES, IO_LINE_INDEX_CACHE_BYTES, IO_MESSAGE_EXCERPT_BYTES
+
+# (path, size, modification time, normalize) -> hashes of the lines of an expected output,
+# least recently used first
+LINE_INDEX_CACHE: 'OrderedDict[Tuple[str, int, int, bool], array]' = OrderedDict()
+LINE_INDEX_CACHE_STATS: Dict[str, int] = {'bytes': 0}
+
+def file_line_blocks(filename: str, normalize: bool) -> Generator[List[str], None, None]:
+    '''
+    the lines of a file (memory-mapped), a block of about IO_LINE_BLOCK_BYTES at a time.
+    with normalize, every line has \\r removed and trailing whitespace stripped;
+    otherwise lines keep their \\n, and line endings are translated to \\n (as in text mode).
+    '''
+    with open(filename, 'rb') as file:
+        if stat(file.fileno()).st_size == 0:
+            # empty files can't be mapped
+            return
+        with mmap(file.fileno(), 0, access=ACCESS_READ) as mapped:
+            size = len(mapped)
+            position = 0
+            while position < size:
+                # blocks end at the end of a line, and \n is never part of a multi-byte character,
+                # so every block decodes on its own
+                end = mapped.find(b'\n', min(position + IO_LINE_BLOCK_BYTES, size) - 1)
+                end = size if end == -1 else end + 1
+                text = mapped[position:end].decode('utf-8', errors='backslashreplace')
+                position = end
+                if normalize:
+                    lines = text.replace('\r', '').split('\n')
+                else:
+                    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+                # the piece after the last \n is only a line if it isn't empty
+                last = lines.pop()
+                if normalize:
+                    block = [line.rstrip() for line in lines]
+                else:
+                    block = [line + '\n' for line in lines]
+                if last:
+                    block.append(last.rstrip() if normalize else last)
+                yield block
+
+def file_lines(filename: str, normalize: bool, start: int = 0) -> Generator[str, None, None]:
+    '''
+    the lines of a file (as in file_line_blocks), after the first start lines.
+    '''
+    blocks = file_line_blocks(filename, normalize)
+    try:
+        for block in blocks:
+            if start >= len(block):
+                start -= len(block)
+                continue
+            yield from block[start:]
+            start = 0
+    finally:
+        blocks.close()
+
+def file_tokens(filename: str) -> Generator[str, None, None]:
+    '''
+    the (whitespace-separated) tokens of a file.
+    '''
+    blocks = file_line_blocks(filename, True)
+    try:
+        for block in blocks:
+            yield from ' '.join(block).split()
+    finally:
+        blocks.close()
+
+def file_patterns(filename: str) -> Generator[Pattern[str], None, None]:
+    '''
+    the regular expressions on the lines of a file, each distinct one compiled once.
+    raises ValueError if one isn't a valid regular expression.
+    '''
+    compiled: Dict[str, Pattern[str]] = {}
+    lines = file_lines(filename, True)
+    try:
+        for line_number, line in enumerate(lines, 1):
+            if line not in compiled:
+                try:
+                    compiled[line] = re.compile(line)
+                except re.error as exc:
+                    raise ValueError(f'line {line_number} is not a valid regular expression ({exc}): {line}') from exc
+            yield compiled[line]
+    finally:
+        lines.close()
+
+def line_index(filename: str, normalize: bool) -> Optional[array]:
+    '''
+    the hashes of the lines of an expected output (without trailing blank lines, with normalize),
+    or None if there are too many lines to cache.
+    '''
+    status = stat(filename)
+    key = (abspath(filename), status.st_size, status.st_mtime_ns, normalize)
+    if key in LINE_INDEX_CACHE:
+        LINE_INDEX_CACHE.move_to_end(key)
+        return LINE_INDEX_CACHE[key]
+    index = array('q')
+    max_lines = IO_LINE_INDEX_CACHE_BYTES // index.itemsize
+    last_line = 0
+    blocks = file_line_blocks(filename, normalize)
+    for block in blocks:
+        if len(index) + len(block) > max_lines:
+            blocks.close()
+            return None
+        for position in range(len(block) - 1, -1, -1):
+            if block[position]:
+                last_line = len(index) + position + 1
+                break
+        index.extend(array('q', map(hash, block)))
+    if normalize:
+        del index[last_line:]
+    LINE_INDEX_CACHE[key] = index
+    LINE_INDEX_CACHE_STATS['bytes'] += len(index) * index.itemsize
+    while LINE_INDEX_CACHE_STATS['bytes'] > IO_LINE_INDEX_CACHE_BYTES:
+        _, evicted = LINE_INDEX_CACHE.popitem(last=False)
+        LINE_INDEX_CACHE_STATS['bytes'] -= len(evicted) * evicted.itemsize
+    return index
+
+def excerpt(data: bytes, limit: int = IO_MESSAGE_EXCERPT_BYTES) -> str:
+    '''
+    the start of some data, for the student, with a note if it was cut short.
+    '''
+    text = data[:limit].decode('utf-8', errors='backslashreplace').rstrip()
+    if len(data) > limit:
+        text += '\n... (cut short)'
+    return text
+
+def file_excerpt(filename: str, limit: int = IO_MESSAGE_EXCERPT_BYTES) -> str:
+    '''
+    the start of a file, for the student, with a note if it was cut short.
+    '''
+    with open(filename, 'rb') as file:
+        data = file.read(limit + 1)
+    return excerpt(data, limit)
+
+class OutputComparator:
+    '''
+    Compares output, fed to it in chunks, with the expected output in a file, a batch of lines at a time.
+    subclasses say how the lines compare (compare_lines), and what must be true of the expected
+    output that is left once the output ends (compare_rest).
+
+    with normalize, lines of output have trailing whitespace removed; otherwise they keep their \\n.
+    '''
+    # lines before the first difference that describe_mismatch shows (from the expected output)
+    context_lines = IO_DIFF_CONTEXT_LINES
+
+    def __init__(
+            self,
+            expected_file: str,
+            argument: str = '',
+            stop_at_mismatch: bool = True,
+            normalize: bool = True) -> None:
+        self.expected_file = expected_file
+        self.argument = argument
+        self.stop_at_mismatch = stop_at_mismatch
+        self.normalize = normalize
+        self.decoder = getincrementaldecoder('utf-8')(errors='backslashreplace')
+        # the start of a line that hasn't ended yet
+        self.partial: List[str] = []
+        # lines of output compared so far
+        self.line_number = 0
+        self.output_ended = False
+        # the line number where the output first differs, if it does
+        self.mismatch: Optional[int] = None
+        # the lines of output from the first difference on (just enough to show)
+        self.differing_lines: List[str] = []
+
+    @staticmethod
+    def check_argument(argument: str) -> None:
+        '''
+        raise ValueError if the argument (after the : in @compare) isn't valid.
+        '''
+        if argument:
+            raise ValueError(f'unexpected argument: {argument}')
+
+    @staticmethod
+    def check_expected_output(expected_file: str) -> None:
+        '''
+        raise ValueError if the expected output isn't valid for this comparison.
+        '''
+
+    def __enter__(self) -> 'OutputComparator':
+        return self
+
+    def __exit__(
+            self,
+            exc_type: Optional[Type[BaseException]],
+            exc_value: Optional[BaseException],
+            traceback: Optional[TracebackType]) -> None:
+        self.close()
+
+    def close(self) -> None:
+        '''
+        close the expected output.
+        '''
+
+    def compare_lines(self, lines: List[str]) -> None:
+        '''
+        compare the next lines of output (split and normalized) with the expected output,
+        and call found_mismatch if they differ.
+        '''
+        raise NotImplementedError
+
+    def compare_rest(self) -> bool:
+        '''
+        once the output has ended, true if nothing more was expected (otherwise, set mismatch).
+        '''
+        raise NotImplementedError
+
+    def found_mismatch(self, position: int, lines: List[str]) -> None:
+        '''
+        record that the output first differs at lines[position].
+        '''
+        self.mismatch = self.line_number + position + 1
+        self.differing_lines = lines[position:position + IO_DIFF_CONTEXT_LINES]
+
+    def take_lines(self, lines: List[str]) -> None:
+        '''
+        compare the next lines of output, or just keep them to show if the output already differs.
+        '''
+        if self.mismatch is not None:
+            self.differing_lines.extend(lines[:IO_DIFF_CONTEXT_LINES - len(self.differing_lines)])
+            return
+        self.compare_lines(lines)
+        if self.mismatch is None:
+            self.line_number += len(lines)
+
+    def split_lines(self, text: str) -> List[str]:
+        '''
+        split (the start of) a chunk of output into lines, normalized, and keep what is left of the last line.
+        '''
+        if self.partial:
+            self.partial.append(text)
+            text = ''.join(self.partial)
+            self.partial.clear()
+        lines = text.split('\n')
+        rest = lines.pop()
+        if rest:
+            self.partial.append(rest)
+        if self.normalize:
+            return [line.rstrip() for line in lines]
+        return [line + '\n' for line in lines]
+
+    def done(self) -> bool:
+        '''
+        true once the output can't match and the lines to show have been kept.
+        '''
+        return self.mismatch is not None and len(self.differing_lines) >= IO_DIFF_CONTEXT_LINES
+
+    def feed(self, data: bytes) -> bool:
+        '''
+        compare the next chunk of output.
+        returns false once the output can't match (if the comparator stops at the first mismatch).
+        '''
+        if not self.done():
+            text = self.decoder.decode(data)
+            if '\n' in text:
+                self.take_lines(self.split_lines(text))
+            elif text:
+                # (joined once the line ends)
+                self.partial.append(text)
+        return not (self.stop_at_mismatch and self.done())
+
+    def finish(self) -> bool:
+        '''
+        compare what is left once the output has ended.
+        returns true if the output matches the expected output.
+        '''
+        if not self.done():
+            last = ''.join(self.partial) + self.decoder.decode(b'', final=True)
+            self.partial.clear()
+            if last:
+                self.take_lines([last.rstrip() if self.normalize else last])
+            self.output_ended = True
+        return self.mismatch is None and self.compare_rest()
+
+    def describe_output(self) -> str:
+        '''
+        the lines of output from the first difference on.
+        '''
+        assert self.mismatch is not None
+        message = ''
+        for offset, line in enumerate(self.differing_lines):
+            message += f'  {self.mismatch + offset:>6} | {line.rstrip(chr(10))}\n'
+        if self.output_ended and len(self.differing_lines) < IO_DIFF_CONTEXT_LINES:
+            message += f'  {self.mismatch + len(self.differing_lines):>6} | (end of output)\n'
+        return message
+
+    def describe_mismatch(self) -> str:
+        '''
+        the first lines that differ, after the few lines before them, or '' if there is no difference.
+        '''
+        if self.mismatch is None:
+            return ''
+        number = self.mismatch
+        # the lines before the difference are the same in both, so they are read from the expected output
+        first = max(number - 1 - self.context_lines, 0)
+        expected_lines = file_lines(self.expected_file, self.normalize, first)
+        expected = list(islice(expected_lines, number - 1 - first + IO_DIFF_CONTEXT_LINES))
+        expected_lines.close()
+        context, expected = expected[:number - 1 - first], expected[number - 1 - first:]
+        message = f'First difference at line {number}:\n'
+        for offset, line in enumerate(context):
+            message += f'  {first + 1 + offset:>6} | {line.rstrip(chr(10))}\n'
+        message += 'Expected output:\n'
+        for offset, line in enumerate(expected):
+            message += f'  {number + offset:>6} | {line.rstrip(chr(10))}\n'
+        if len(expected) < IO_DIFF_CONTEXT_LINES:
+            message += f'  {number + len(expected):>6} | (end of output)\n'
+        return message + 'Your output:\n' + self.describe_output() + '\n'
+
+class LineComparator(OutputComparator):
+    '''
+    Compares output with the expected output line by line (@compare: exact).
+
+    with normalize, both sides have trailing whitespace removed from every line (and the expected
+    output has every \\r removed); otherwise the lines must match exactly.
+
+    as long as the output is the same as the expected output byte for byte (and has no \\r, which
+    either comparison treats specially), it is compared with the memory-mapped file as it is, and
+    only from the first byte that differs is it split into lines.
+    '''
+    def __init__(
+            self,
+            expected_file: str,
+            argument: str = '',
+            stop_at_mismatch: bool = True,
+            normalize: bool = True) -> None:
+        super().__init__(expected_file, argument, stop_at_mismatch, normalize)
+        self.file = open(expected_file, 'rb')
+        # empty files can't be mapped
+        self.mapped: Optional[mmap] = None
+        if stat(self.file.fileno()).st_size > 0:
+            self.mapped = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        # bytes of output that are the same as the expected output,
+        # and where the line that they end in starts
+        self.same_bytes = 0
+        self.line_start = 0
+        self.by_line = False
+        # the hashes of the expected lines, or (if there are too many) the expected lines themselves
+        self.index: Optional[array] = None
+        self.expected_lines: Optional[Generator[str, None, None]] = None
+        if self.mapped is None:
+            self.compare_by_line()
+
+    def close(self) -> None:
+        '''
+        unmap and close the expected output.
+        '''
+        if self.expected_lines is not None:
+            self.expected_lines.close()
+        if self.mapped is not None:
+            self.mapped.close()
+        self.file.close()
+
+    def compare_by_line(self) -> None:
+        '''
+        compare the rest of the output line by line, from the start of the line where it first differs.
+        '''
+        self.by_line = True
+        self.index = line_index(self.expected_file, self.normalize)
+        if self.index is None:
+            self.expected_lines = file_lines(self.expected_file, self.normalize, self.line_number)
+        if self.mapped is not None and self.line_start < self.same_bytes:
+            self.partial.append(self.decoder.decode(self.mapped[self.line_start:self.same_bytes]))
+
+    def compare_lines(self, lines: List[str]) -> None:
+        expected: Sequence[int | str]
+        actual: Sequence[int | str]
+        if self.index is not None:
+            expected = self.index[self.line_number:self.line_number + len(lines)]
+            actual = array('q', map(hash, lines))
+        else:
+            assert self.expected_lines is not None
+            expected = list(islice(self.expected_lines, len(lines)))
+            actual = lines
+        # all at once, when they match, and line by line when they don't
+        if len(expected) < len(lines) or actual != expected:
+            for position, line in enumerate(lines):
+                # once the expected output has ended, only blank lines match
+                if (actual[position] != expected[position]) if position < len(expected) else (line != ''):
+                    self.found_mismatch(position, lines)
+                    return
+
+    def compare_rest(self) -> bool:
+        # what is left of the expected output must be blank
+        remaining: Iterator[int | str]
+        blank: int | str
+        if self.index is not None:
+            remaining = iter(self.index[self.line_number:])
+            blank = hash('')
+        else:
+            assert self.expected_lines is not None
+            remaining = self.expected_lines
+            blank = ''
+        for offset, expected in enumerate(remaining):
+            if expected != blank:
+                self.mismatch = self.line_number + offset + 1
+                return False
+        return True
+
+    def feed(self, data: bytes) -> bool:
+        if not self.by_line:
+            assert self.mapped is not None
+            end = self.same_bytes + len(data)
+            if b'\r' not in data and self.mapped[self.same_bytes:end] == data:
+                last_newline = data.rfind(b'\n')
+                if last_newline != -1:
+                    self.line_number += data.count(b'\n')
+                    self.line_start = self.same_bytes + last_newline + 1
+                self.same_bytes = end
+                return True
+            self.compare_by_line()
+        return super().feed(data)
+
+    def finish(self) -> bool:
+        if not self.by_line:
+            assert self.mapped is not None
+            if self.same_bytes == len(self.mapped):
+                return True
+            self.compare_by_line()
+        return super().finish()
+
+class RegexComparator(OutputComparator):
+    '''
+    Compares every line of output with the regular expression on the same line of the expected output
+    (@compare: regex), which must match all of it. a missing line of output is an empty line.
+    '''
+    # the lines before the difference matched, but aren't the same as the expected output
+    context_lines = 0
+
+    def __init__(self, expected_file: str, argument: str = '', stop_at_mismatch: bool = True) -> None:
+        super().__init__(expected_file, argument, stop_at_mismatch)
+        self.patterns = file_patterns(expected_file)
+
+    @staticmethod
+    def check_expected_output(expected_file: str) -> None:
+        for _ in file_patterns(expected_file):
+            pass
+
+    def close(self) -> None:
+        self.patterns.close()
+
+    def compare_lines(self, lines: List[str]) -> None:
+        patterns = list(islice(self.patterns, len(lines)))
+        for position, line in enumerate(lines):
+            # once the expected output has ended, only blank lines match
+            if not patterns[position].fullmatch(line) if position < len(patterns) else line != '':
+                self.found_mismatch(position, lines)
+                return
+
+    def compare_rest(self) -> bool:
+        for offset, pattern in enumerate(self.patterns):
+            if not pattern.fullmatch(''):
+                self.mismatch = self.line_number + offset + 1
+                return False
+        return True
+
+class TokenComparator(OutputComparator):
+    '''
+    Compares the (whitespace-separated) tokens of the output with those of the expected output
+    (@compare: tokens), however either is split into lines.
+    '''
+    def __init__(self, expected_file: str, argument: str = '', stop_at_mismatch: bool = True) -> None:
+        super().__init__(expected_file, argument, stop_at_mismatch)
+        self.expected_tokens = file_tokens(expected_file)
+        # (expected token, actual token) where they first differ (None for the end of either)
+        self.differing_tokens: Tuple[Optional[str], Optional[str]] = (None, None)
+        # tokens of output that matched (before the first difference, if there is one)
+        self.token_count = 0
+
+    def close(self) -> None:
+        self.expected_tokens.close()
+
+    def tokens_match(self, actual: str, expected: str) -> bool:
+        '''
+        true if a token of output matches the expected token.
+        '''
+        return actual == expected
+
+    def compare_lines(self, lines: List[str]) -> None:
+        tokens = ' '.join(lines).split()
+        expected = list(islice(self.expected_tokens, len(tokens)))
+        # all at once, when they match, and token by token when they don't
+        if len(expected) == len(tokens) and (tokens == expected or all(map(self.tokens_match, tokens, expected))):
+            self.token_count += len(tokens)
+            return
+        # line by line, so the difference is found on the line that it is on
+        index = 0
+        for position, line in enumerate(lines):
+            for token in line.split():
+                if index >= len(expected) or not self.tokens_match(token, expected[index]):
+                    self.differing_tokens = (expected[index] if index < len(expected) else None, token)
+                    self.token_count += index
+                    self.found_mismatch(position, lines)
+                    return
+                index += 1
+
+    def expected_line(self) -> int:
+        '''
+        the line of the expected output that the first differing token is on
+        (or the line after the last one, if the expected output ended first).
+        '''
+        count = 0
+        number = 0
+        lines = file_lines(self.expected_file, True)
+        try:
+            for number, line in enumerate(lines, 1):
+                count += len(line.split())
+                if count > self.token_count:
+                    return number
+        finally:
+            lines.close()
+        return number + 1
+
+    def compare_rest(self) -> bool:
+        expected = next(self.expected_tokens, None)
+        if expected is None:
+            return True
+        self.differing_tokens = (expected, None)
+        self.mismatch = self.line_number + 1
+        return False
+
+    def describe_mismatch(self) -> str:
+        if self.mismatch is None:
+            return ''
+        expected, actual = self.differing_tokens
+        message = f'First difference at line {self.mismatch} of your output:\n'
+        if expected is not None:
+            message += f'expected: {expected} (line {self.expected_line()} of the expected output)\n'
+        else:
+            message += 'expected: (end of output)\n'
+        message += f'  actual: {actual if actual is not None else "(end of output)"}\n'
+        return message + 'Your output:\n' + self.describe_output() + '\n'
+
+class FloatComparator(TokenComparator):
+    '''
+    Compares tokens as TokenComparator does, except that numbers only have to be close
+    (@compare: float:<tolerance>): within the tolerance of each other, or relative to their size.
+    '''
+    def __init__(self, expected_file: str, argument: str = '', stop_at_mismatch: bool = True) -> None:
+        super().__init__(expected_file, argument, stop_at_mismatch)
+        self.tolerance = float(argument) if argument else DEFAULT_FLOAT_TOLERANCE
+
+    @staticmethod
+    def check_argument(argument: str) -> None:
+        if argument:
+            tolerance = float(argument)
+            if not isfinite(tolerance) or tolerance < 0:
+                raise ValueError(f'tolerance must be a non-negative number: {argument}')
+
+    def tokens_match(self, actual: str, expected: str) -> bool:
+        if actual == expected:
+            return True
+        try:
+            return isclose(float(actual), float(expected), rel_tol=self.tolerance, abs_tol=self.tolerance)
+        except ValueError:
+            return False
+
+    def describe_mismatch(self) -> str:
+        if self.mismatch is None:
+            return ''
+        return super().describe_mismatch().replace('\n', f' (numbers within {self.tolerance:g})\n', 1)
+
+class UnorderedComparator(OutputComparator):
+    '''
+    Compares the (non-blank) lines of output with those of the expected output, in any order
+    (@compare: unordered), as many times as each is expected.
+    '''
+    def __init__(self, expected_file: str, argument: str = '', stop_at_mismatch: bool = True) -> None:
+        super().__init__(expected_file, argument, stop_at_mismatch)
+        # expected line -> how many more times it is expected
+        self.remaining: Counter[str] = Counter()
+        for block in file_line_blocks(expected_file, True):
+            self.remaining.update(line for line in block if line)
+        # an expected line that the output is missing
+        self.missing_line: Optional[str] = None
+
+    def compare_lines(self, lines: List[str]) -> None:
+        remaining = self.remaining
+        for position, line in enumerate(lines):
+            if not line:
+                continue
+            if remaining[line] == 0:
+                self.found_mismatch(position, lines)
+                return
+            remaining[line] -= 1
+
+    def compare_rest(self) -> bool:
+        for line, count in self.remaining.items():
+            if count > 0:
+                self.missing_line = line
+                self.mismatch = self.line_number + 1
+                return False
+        return True
+
+    def describe_mismatch(self) -> str:
+        if self.mismatch is None:
+            return ''
+        if self.missing_line is not None:
+            missing = sum(self.remaining.values())
+            return (
+                f'Your output is missing {missing} expected line(s) (in any order), e.g.:\n'
+                f'  {self.missing_line}\n\n')
+        return (
+            f'Line {self.mismatch} of your output is not expected (or not that many times, in any order):\n'
+            + self.describe_output() + '\n')
+
+# @compare name -> comparator
+COMPARATORS: Dict[str, Type[OutputComparator]] = {
+    'exact': LineComparator,
+    'tokens': TokenComparator,
+    'float': FloatComparator,
+    'unordered': UnorderedComparator,
+    'regex': RegexComparator,
+}
+
+def parse_comparison(comparison: str) -> Tuple[str, str]:
+    '''
+    split a @compare value into (name, argument), e.g. "float:1e-3" -> ("float", "1e-3").
+    raises ValueError if there is no such comparison, or its argument isn't valid.
+    '''
+    name, _, argument = comparison.partition(':')
+    name = name.strip().lower()
+    argument = argument.strip()
+    if name not in COMPARATORS:
+        raise ValueError(f'unknown comparison: {name} (expected one of {", ".join(COMPARATORS)})')
+    COMPARATORS[name].check_argument(argument)
+    return name, argument
+
+def check_expected_output(comparison: str, expected_file: str) -> None:
+    '''
+    raise ValueError if an expected output can't be compared with as a @compare value says
+    (e.g. a line of it isn't a valid regular expression, for 'regex').
+    '''
+    name, _ = parse_comparison(comparison)
+    COMPARATORS[name].check_expected_output(expected_file)
+
+def make_comparator(comparison: str, expected_file: str, stop_at_mismatch: bool = True) -> OutputComparator:
+    '''
+    the comparator for a @compare value (see the top of this file).
+    '''
+    name, argument = parse_comparison(comparison)
+    return COMPARATORS[name](expected_file, argument, stop_at_mismatch)
@@ -0,0 +1,192 @@
+'''
+Running the programs under test.
+
+Every test runs in a session (and so a process group) of its own, so that when it times out, the
+whole group is killed: the test, and anything it started (e.g. the program that a script runs).
+The test is always reaped, and whatever it leaves running in the background is killed too.
+
+Output is read as it is produced, and only the beginning and the end of it are kept, so a test that
+prints too much is stopped (and its output truncated) instead of running the grader out of memory.
+'''
+
+from collections import deque
+from dataclasses import dataclass
+from os import killpg, read
+from os.path import getsize
+from selectors import EVENT_READ, DefaultSelector
+from signal import SIGKILL
+import subprocess
+from time import time
+from typing import IO, Callable, Deque, Dict, List, Optional
+
+from config import MAX_OUTPUT_BYTES
+
+@dataclass
+class ProcessResult:
+    '''
+    What a test process did.
+    '''
+    # exit status (negative if it was killed by a signal)
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    # true if the test was killed for running too long
+    timed_out: bool
+    # why the process group was killed, or '' if the test finished on its own
+    kill_reason: str
+
+class BoundedOutput:
+    '''
+    The first and last bytes written to a stream, up to a limit in total.
+    '''
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.head = bytearray()
+        # chunks, with the oldest dropped once there are more than tail_limit bytes
+        self.tail: Deque[bytes] = deque()
+        self.tail_size = 0
+        self.size = 0
+
+    def write(self, data: bytes) -> None:
+        '''
+        add data to the stream.
+        '''
+        self.size += len(data)
+        head_room = self.limit // 2 - len(self.head)
+        if head_room > 0:
+            self.head += data[:head_room]
+            data = data[head_room:]
+        if not data:
+            return
+        self.tail.append(data)
+        self.tail_size += len(data)
+        tail_limit = self.limit - self.limit // 2
+        while self.tail and self.tail_size - len(self.tail[0]) >= tail_limit:
+            self.tail_size -= len(self.tail.popleft())
+        if self.tail_size > tail_limit:
+            self.tail[0] = self.tail[0][self.tail_size - tail_limit:]
+            self.tail_size = tail_limit
+
+    def exceeded(self) -> bool:
+        '''
+        true if more than limit bytes were written.
+        '''
+        return self.size > self.limit
+
+    def value(self) -> bytes:
+        '''
+        everything that was kept, with a note where bytes were dropped.
+        '''
+        tail = b''.join(self.tail)
+        if not self.exceeded():
+            return bytes(self.head) + tail
+        note = f'\n... output truncated at {self.limit} bytes ...\n'.encode('utf-8')
+        return bytes(self.head) + note + tail
+
+def timeout_kill_reason(timeout: float) -> str:
+    '''
+    the kill reason for a test that ran out of time.
+    '''
+    seconds = 'second' if timeout == 1 else 'seconds'
+    return f'killed after {timeout:g} {seconds}, along with every process it started\n'
+
+def io_output_limit(output_file: str) -> int:
+    '''
+    the output limit for an i/o test, which leaves room for (a lot more than) the expected output.
+    '''
+    return max(MAX_OUTPUT_BYTES, 2 * getsize(output_file))
+
+def kill_process_group(p: subprocess.Popen) -> None:
+    '''
+    kill every process in the process group of p (which leads the group).
+    '''
+    try:
+        killpg(p.pid, SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        # nothing left to kill
+        pass
+
+def run_process(
+        cmd: List[str] | str,
+        timeout: float,
+        stdin: Optional[IO[bytes]] = None,
+        capture: bool = True,
+        shell: bool = False,
+        max_output: int = MAX_OUTPUT_BYTES,
+        on_stdout: Optional[Callable[[bytes], bool]] = None) -> ProcessResult:
+    '''
+    run a test process in its own process group, and kill the group if it times out.
+
+    Args:
+        cmd (List[str] | str): the command (a string if shell is true)
+        timeout (float): how long to wait (in seconds) before killing the process group
+        stdin (Optional[IO[bytes]]): file to use as standard input (default: empty input)
+        capture (bool): capture stdout and stderr (otherwise they are inherited)
+        shell (bool): run the command with the shell
+        max_output (int): the test is killed once it prints more than this many bytes (to either stream)
+        on_stdout (Optional[Callable[[bytes], bool]]): called with stdout as it is read, the test is killed if it returns false
+
+    Returns:
+        ProcessResult: exit status, output, and why the test was killed (if it was)
+    '''
+    p = subprocess.Popen(
+        cmd,
+        stdin=stdin if stdin is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE if capture else None,
+        stderr=subprocess.PIPE if capture else None,
+        shell=shell,
+        start_new_session=True)
+    stdout = BoundedOutput(max_output)
+    stderr = BoundedOutput(max_output)
+    # file descriptor -> where its output goes
+    outputs: Dict[int, BoundedOutput] = {}
+    if p.stdout is not None and p.stderr is not None:
+        outputs = {p.stdout.fileno(): stdout, p.stderr.fileno(): stderr}
+    timed_out = False
+    kill_reason = ''
+    try:
+        with DefaultSelector() as selector:
+            for fd in outputs:
+                selector.register(fd, EVENT_READ)
+            deadline = time() + timeout
+            exited = False
+            while selector.get_map() and not kill_reason:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    timed_out = True
+                    kill_reason = timeout_kill_reason(timeout)
+                    break
+                if not exited and p.poll() is not None:
+                    # whatever it left in the background may hold the pipes open; what was printed is still read
+                    exited = True
+                    kill_process_group(p)
+                for key, _ in selector.select(min(remaining, 0.1)):
+                    chunk = read(key.fd, 1 << 16)
+                    if not chunk:
+                        selector.unregister(key.fd)
+                        continue
+                    outputs[key.fd].write(chunk)
+                    if outputs[key.fd].exceeded():
+                        kill_reason = f'killed after printing more than {max_output} bytes\n'
+                    elif on_stdout is not None and outputs[key.fd] is stdout and not on_stdout(chunk):
+                        kill_reason = 'stopped once its output could no longer be correct\n'
+        if not kill_reason:
+            try:
+                p.wait(max(deadline - time(), 0))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+                kill_reason = timeout_kill_reason(timeout)
+        if kill_reason:
+            kill_process_group(p)
+        p.wait()
+    except BaseException:
+        kill_process_group(p)
+        p.wait()
+        raise
+    finally:
+        for pipe in (p.stdout, p.stderr):
+            if pipe is not None:
+                pipe.close()
+    # don't let anything it started in the background outlive the test
+    kill_process_group(p)
+    return ProcessResult(p.returncode, stdout.value(), stderr.value(), timed_out, kill_reason)
@@ -1,25 +1,38 @@
 #!/usr/bin/env bash
 
 usage() {
-  echo "Usage: $0 [-d] [-h] [-t <number>] <filenames>"
+  echo "Usage: $0 [-c <dir>] [-d] [-h] [-j <jobs>] [-p <dir>] [-t <tests>] <filenames>"
+  echo "  -c <dir>      cache compiler results in directory"
   echo "  -d            run tests in debug mode"
   echo "  -h            show this help message and exit"
+  echo "  -j <jobs>     number of tests to run in parallel"
   echo "  -l <language> expected programming language"
-  echo "  -t <number>   run test(s) with specified number"
+  echo "  -p <dir>      cache parsed tests in directory"
+  echo "  -t <tests>    run selected test(s), e.g. 5 or 1,3-5,type=unit,name=*insert*"
 }
 
 # default language is c++ (legacy)
 language=c++
 
 debugmode=0
-while getopts "dhl:t:" flag; do
+jobs=1
+while getopts "c:dhj:l:p:t:" flag; do
   case "${flag}" in
+    c)
+      compile_cache=$(realpath -m "${OPTARG}")
+      ;;
     d)
       debugmode=1
       ;;
+    j)
+      jobs=${OPTARG}
+      ;;
     l)
       language=${OPTARG}
       ;;
+    p)
+      test_plan_cache=$(realpath -m "${OPTARG}")
+      ;;
     t)
       tests=${OPTARG}
       ;;
@@ -108,9 +121,15 @@ done
 # copy core test runners to testbox
 cp $AUTOGRADER_CORE_REPO/run_tests.py $TESTBOX/
 cp $AUTOGRADER_CORE_REPO/attributes.py $TESTBOX/
+cp $AUTOGRADER_CORE_REPO/compile_cache.py $TESTBOX/
 cp $AUTOGRADER_CORE_REPO/config.py $TESTBOX/
+cp $AUTOGRADER_CORE_REPO/fixtures.py $TESTBOX/
+cp $AUTOGRADER_CORE_REPO/io_testing.py $TESTBOX/
+cp $AUTOGRADER_CORE_REPO/output_comparison.py $TESTBOX/
+cp $AUTOGRADER_CORE_REPO/process_control.py $TESTBOX/
 cp $AUTOGRADER_CORE_REPO/results.py $TESTBOX/
 cp $AUTOGRADER_CORE_REPO/test_parsing.py $TESTBOX/
+cp $AUTOGRADER_CORE_REPO/test_selection.py $TESTBOX/
 cp $AUTOGRADER_CORE_REPO/test_types.py $TESTBOX/
 cp -r $AUTOGRADER_CORE_REPO/tests/$language/* $TESTBOX/
 # TODO(pcr): can't this be refactored to extract common code?
@@ -180,11 +199,19 @@ for file in "${scripts[@]}"; do
 done
 
 # run tests <tests file> [-r results file]
-flags="-l $language"
+flags="-l $language -j $jobs"
 if [ $debugmode -eq 1 ]; then
   flags="$flags --debugmode"
 fi
+if [ ! -z  "${compile_cache}" ]; then
+  flags="$flags -c $compile_cache"
+fi
+if [ ! -z  "${test_plan_cache}" ]; then
+  flags="$flags -p $test_plan_cache"
+fi
+# quoted separately, since a selection may contain globs
+selection=()
 if [ ! -z  "${tests}" ]; then
-  flags="$flags -t $tests"
+  selection=(-t "$tests")
 fi
-$python run_tests.py $flags $testFile -r $RESULTS_DIR/results.json
+$python run_tests.py $flags "${selection[@]}" $testFile -r $RESULTS_DIR/results.json
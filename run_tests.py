@@ -4,25 +4,42 @@
 TODO(pcr):
 * move configuration stuff to configuration file (and let it be assignment-specific)
 * refine attribute requirements
-* add command line option to run a specific test or set of tests
 * use @target attribute for coverage tests and some other test(s) that don't use it but could/should
 '''
 
-from typing import List, Dict, Any, Tuple
-from os.path import exists as path_exists
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from os import chdir, close, dup, dup2, environ, getcwd, link, lstat, makedirs, readlink, remove, symlink, walk
+from os.path import abspath, dirname, exists as path_exists, isdir, islink, join as path_join, lexists, normpath,\
+    relpath
+from shutil import copy2, rmtree
+from tempfile import TemporaryFile, mkdtemp
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Value
 import json
+import sys
 from argparse import ArgumentParser, Namespace
 from config import DEFAULT_STDOUT_VISIBILITY, DEFAULT_VISIBILITY, OCTOTHORPE_LINE, OCTOTHORPE_WALL,\
-    SNARKY_SUBMISSION_SCORE_THRESHHOLD
-from results import Result, TestResult
+    SANDBOX_LINK_BYTES, SNARKY_SUBMISSION_SCORE_THRESHHOLD, TEST_PLAN_CACHE_DIR, WORKER_ID_VARIABLE
+from results import PartialTestResult, Result, TestResult
+from compile_cache import CACHE_STATS, compile_cache_enabled, configure_compile_cache,\
+    merge_compile_cache_stats, reset_compile_cache_stats
 from test_parsing import read_tests
+from test_selection import TestIndex
 from attributes import Attributes
 
  # these are importable once all the files are collected in the testbox
 from test_writing import write_test
-from test_compiling import compile_test
+from test_compiling import compile_test, precompile_tests
 from test_running import run_test
 
+# compiles, compile output, and the result of running (if it compiled)
+TestOutcome = Tuple[bool, str, Optional[PartialTestResult]]
+
+# the files in this worker's sandbox, as they were taken from the testbox
+# (path relative to the sandbox -> inode, modification time, and size)
+SANDBOX_FILES: Dict[str, Tuple[int, int, int]] = {}
+
 def print_results(params: Dict[str, Any]) -> None:
     '''
     pretty-print the results
@@ -69,25 +86,21 @@ def print_results(params: Dict[str, Any]) -> None:
         print('!!! ZERO DUE TO UNAPPROVED INCLUDES')
     if not sufficient_coverage:
         print('!!! ZERO DUE TO INSUFFICIENT COVERAGE')
+    if compile_cache_enabled():
+        print(f"compile cache: {CACHE_STATS['hits']} hits, {CACHE_STATS['misses']} misses")
 
 def apply_test_filter(test_number: str, tests: List[Attributes]) -> None:
     '''
-    run only those tests with number that matches test_number
+    run only those tests that match test_number (a selection, see test_selection.py)
       '*' means run all tests
       '5' means run all tests numbered 5: 5[.1, 5.2, ...], 5[a, b, ...]
       '5.2' means run all tests numbered 5.2: 5.2[.1, 5.2.2, ...], 5.2[a, b, ...]
+      '1,3-5,type=unit,name=*insert*' means run tests 1 and 3 through 5, unit tests, and tests named *insert*
     '''
     if test_number != '*':
-        for test in tests:
-            if (test['number'] == test_number or
-                (test['number'].startswith(test_number) and
-                 len(test['number']) >= len(test_number) and
-                 test['number'][len(test_number)] not in '0123456789'
-                )
-               ):
-                test['skip'] = False
-            else:
-                test['skip'] = True
+        selected = TestIndex(tests).select(test_number)
+        for index, test in enumerate(tests):
+            test['skip'] = index not in selected
 
 def possible_points(tests: List[Attributes]) -> float:
     '''
@@ -99,6 +112,151 @@ def possible_points(tests: List[Attributes]) -> float:
             possible += test['points']
     return possible
 
+def run_single_test(test: Attributes) -> TestOutcome:
+    '''
+    write, compile, and run a single test in the current directory.
+    '''
+    write_test(test)
+
+    compiles, compile_output = compile_test(test)
+
+    if not compiles:
+        print('[FAIL] failed to compile\n')
+        return compiles, compile_output, None
+
+    return compiles, compile_output, run_test(test)
+
+def run_tests_serially(tests: List[Attributes]) -> Iterator[TestOutcome]:
+    '''
+    run tests one at a time in the testbox, yielding outcomes in order.
+    '''
+    for test in tests:
+        print(f"test {test['number']}: {test['name']}")
+        yield run_single_test(test)
+
+def restore_sandbox_file(testbox: str, sandbox: str, path: str) -> None:
+    '''
+    put the testbox's file at path (relative) into the sandbox: symlinks are recreated, large files
+    are hard-linked, and the rest are copied.
+    '''
+    source = path_join(testbox, path)
+    destination = path_join(sandbox, path)
+    if lexists(destination):
+        remove(destination)
+    makedirs(dirname(destination), exist_ok=True)
+    if islink(source):
+        symlink(readlink(source), destination)
+    elif lstat(source).st_size < SANDBOX_LINK_BYTES:
+        copy2(source, destination)
+    else:
+        try:
+            link(source, destination)
+        except OSError:  # e.g., the sandboxes are on another file system
+            copy2(source, destination)
+    status = lstat(destination)
+    SANDBOX_FILES[path] = (status.st_ino, status.st_mtime_ns, status.st_size)
+
+def populate_sandbox(testbox: str, sandbox: str) -> None:
+    '''
+    fill this worker's (new) sandbox with the testbox's files.
+    '''
+    makedirs(sandbox, exist_ok=True)
+    for root, directories, files in walk(testbox):
+        # symlinks to directories are not walked into, but recreated like files
+        for name in files + [name for name in directories if islink(path_join(root, name))]:
+            restore_sandbox_file(testbox, sandbox, normpath(path_join(relpath(root, testbox), name)))
+        for name in directories:
+            makedirs(path_join(sandbox, relpath(root, testbox), name), exist_ok=True)
+
+def reset_sandbox(testbox: str, sandbox: str) -> None:
+    '''
+    undo what the last test did to this worker's sandbox: remove what it made, and restore what it
+    changed or removed, so only the files a test touches are copied again.
+    '''
+    for root, directories, files in walk(sandbox):
+        for name in list(directories):
+            path = normpath(path_join(relpath(root, sandbox), name))
+            original = path_join(testbox, path)
+            if path not in SANDBOX_FILES and (islink(original) or not isdir(original)):
+                rmtree(path_join(root, name), ignore_errors=True)
+                directories.remove(name)
+        for name in files + [name for name in directories if islink(path_join(root, name))]:
+            path = normpath(path_join(relpath(root, sandbox), name))
+            if path not in SANDBOX_FILES:
+                remove(path_join(root, name))
+                continue
+            status = lstat(path_join(root, name))
+            if SANDBOX_FILES[path] != (status.st_ino, status.st_mtime_ns, status.st_size):
+                restore_sandbox_file(testbox, sandbox, path)
+    for path in SANDBOX_FILES:
+        if not lexists(path_join(sandbox, path)):
+            restore_sandbox_file(testbox, sandbox, path)
+
+def run_test_in_sandbox(
+        test: Attributes,
+        testbox: str,
+        sandboxes: str) -> Tuple[str, TestOutcome, Dict[str, int]]:
+    '''
+    run a single test in this worker's copy of the testbox, which is made by its first test and
+    reset by each one after that.
+    returns the captured console output, the outcome of the test, and compile cache stats.
+    '''
+    sandbox = path_join(sandboxes, environ[WORKER_ID_VARIABLE])
+    if SANDBOX_FILES:
+        reset_sandbox(testbox, sandbox)
+    else:
+        populate_sandbox(testbox, sandbox)
+    chdir(sandbox)
+    reset_compile_cache_stats()
+    # standard output itself (not just sys.stdout) goes to the log, so what the processes that the
+    # test starts print (e.g. script tests) is kept with the test, in order, too
+    with TemporaryFile(dir=sandbox) as log:
+        sys.stdout.flush()
+        saved_stdout = dup(1)
+        dup2(log.fileno(), 1)
+        try:
+            with open(1, 'wt', buffering=1, encoding='utf-8', errors='backslashreplace', closefd=False) as stdout, \
+                    redirect_stdout(stdout):
+                outcome = run_single_test(test)
+        finally:
+            dup2(saved_stdout, 1)
+            close(saved_stdout)
+        log.seek(0)
+        output = log.read().decode('utf-8', errors='backslashreplace')
+    return output, outcome, dict(CACHE_STATS)
+
+def number_worker(counter: Any) -> None:
+    '''
+    give each worker process a distinct id (1, 2, ...), so tests can keep shared resources apart.
+    '''
+    with counter.get_lock():
+        counter.value += 1
+        environ[WORKER_ID_VARIABLE] = str(counter.value)
+
+def run_tests_in_parallel(tests: List[Attributes], jobs: int, debugmode: bool) -> Iterator[TestOutcome]:
+    '''
+    run tests concurrently, each worker in its own copy of the testbox, yielding outcomes in order.
+    '''
+    testbox = getcwd()
+    # next to the testbox, so that its files can be hard-linked
+    sandboxes = mkdtemp(prefix='sandboxes-', dir=dirname(testbox))
+    if debugmode:
+        print(f'[DEBUG] sandboxes: {sandboxes}')
+    try:
+        counter = Value('i', 0)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=number_worker, initargs=(counter,)) as executor:
+            futures = [
+                executor.submit(run_test_in_sandbox, test, testbox, sandboxes) for test in tests]
+            for test, future in zip(tests, futures):
+                log, outcome, cache_stats = future.result()
+                merge_compile_cache_stats(cache_stats)
+                print(f"test {test['number']}: {test['name']}")
+                print(log, end='')
+                yield outcome
+    finally:
+        if not debugmode:
+            rmtree(sandboxes, ignore_errors=True)
+
 def main(args: Namespace) -> Result:
     '''
     read, write, compile, run, and collect results of all tests.
@@ -107,10 +265,15 @@ def main(args: Namespace) -> Result:
     filename: str = args.tests_path
     test_number: str = args.tests
     debugmode: bool = args.debugmode
+    jobs: int = max(1, args.jobs)
+    if args.compile_cache:
+        # absolute, because tests in sandboxes run in other directories
+        configure_compile_cache(abspath(args.compile_cache))
     if debugmode:
         print('===DEBUGMODE===')
         print(f'[DEBUG] filename: {filename}')
         print(f'[DEBUG] test_number: {test_number}')
+        print(f'[DEBUG] jobs: {jobs}')
 
     result_score: float = 0.0
     test_results: List[TestResult] = list()
@@ -118,7 +281,7 @@ def main(args: Namespace) -> Result:
     #leaderboard: Optional[LeaderboardEntry] = None
 
     try:
-        tests = read_tests(filename)
+        tests = read_tests(filename, abspath(args.test_plan_cache) if args.test_plan_cache else TEST_PLAN_CACHE_DIR)
     except(SyntaxError, KeyError, ValueError) as err:
         fail_result: Result = {
             'score': 0.0,
@@ -135,7 +298,20 @@ def main(args: Namespace) -> Result:
     if debugmode:
         print(f'[DEBUG] read {len(tests)} tests')
 
-    apply_test_filter(test_number, tests)
+    try:
+        apply_test_filter(test_number, tests)
+    except ValueError as err:
+        fail_result = {
+            'score': 0.0,
+            'output': repr(err),
+            'execution_time': 0.0,
+            'visibility': 'visible',
+            'stdout_visibility': 'visible',
+            'tests': []
+        }
+        print('[FATAL] Error occured while selecting tests:')
+        print(err)
+        return fail_result
 
     if debugmode:
         print(f'[DEBUG] {len([test for test in tests if not test["skip"]])} tests will be run')
@@ -143,29 +319,19 @@ def main(args: Namespace) -> Result:
     unapproved_includes = False
     sufficient_coverage = True
     total_time = 0.0
-    for test in tests:
-        if test['skip']:
-            #print(f"test {test['number']}: {test['name']}\n[SKIP]")
-            continue
-
-        print(f"test {test['number']}: {test['name']}")
-
+    tests_to_run = [test for test in tests if not test['skip']]
+    # in the testbox, so that every sandbox gets whatever is shared
+    precompile_tests(tests_to_run)
+    if jobs > 1:
+        outcomes = run_tests_in_parallel(tests_to_run, jobs, debugmode)
+    else:
+        outcomes = run_tests_serially(tests_to_run)
+    for test, (compiles, compile_output, result) in zip(tests_to_run, outcomes):
         max_points = test['points']
-        status = 'pre-write'
-        compile_output = str()
-        run_output = str()
-
-        write_test(test)
-
-        status = 'created'
-
-        compiles, compile_output = compile_test(test)
-
         status = 'compiled'
+        run_output = str()
 
-        if compiles:
-            result = run_test(test)
-
+        if compiles and result is not None:
             run_output = result['run_output']
             points = result['points']
 
@@ -186,7 +352,6 @@ def main(args: Namespace) -> Result:
 
             total_time += result['run_time']
         else:
-            print('[FAIL] failed to compile\n')
             status = 'failed'
             points = 0
             run_output = ''
@@ -354,13 +519,31 @@ def get_command_line_args() -> Namespace:
         '--tests',
         type=str,
         default='*',
-        help='test(s) to run by prefix [default=*]')
+        help='test(s) to run: comma-separated numbers (by prefix), ranges (3-5), name=<glob>, type=<glob> [default=*]')
     parser.add_argument(
         '-l',
         '--language',
         type=str,
         default='c++',
         help='supported languages: c++, go, java, python, sql')
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        help='number of tests to run in parallel, each in its own copy of the testbox [default=1]')
+    parser.add_argument(
+        '-c',
+        '--compile_cache',
+        type=str,
+        default='',
+        help='directory in which to cache compiler results across runs [default=no cache]')
+    parser.add_argument(
+        '-p',
+        '--test_plan_cache',
+        type=str,
+        default='',
+        help='directory in which to cache parsed tests across runs [default=no cache]')
 
     return parser.parse_args()
 
@@ -444,37 +627,23 @@ def run_autograder() -> None:
     results_filename = args.results_path
     language = args.language
 
-    # in case of resource exhaustion, pre-write a results file
-    kill_mssg = '''
-        the autograding process was killed,
-        probably because it ran out of memory,
-        probably because of too much output,
-        probably because of a print statement in an infinite loop.
-        check your code for infinite loops and other code that might print too much.
-        '''
-    results: Result = {
-        'score': 0.0,
-        'output': kill_mssg,
-        'execution_time': 0.0,
-        'visibility': 'visible',
-        'stdout_visibility': 'visible',
-        'tests': []
-        }
-
-    if running_on_gradescope():
-        keep_max_score(results)
-        write_results_to_file(results, '/autograder/results/results.json')
-
     original_language = language
+    results: Result
     if language.lower() in ('c++', 'cpp', 'go', 'java', 'python', 'sql'):
         # read, write, compile, and run tests
+        # (output is bounded per test, so a print in an infinite loop can't take the grader down with it)
         results = main(args)
 
     else:
         # TODO(pcr): does this need to be student-facing? no, right?
-        results['output'] = f'Unsupported Language: {original_language}'
-        results['visibility'] = 'visible'
-        results['stdout_visibility'] = 'visible'
+        results = {
+            'score': 0.0,
+            'output': f'Unsupported Language: {original_language}',
+            'execution_time': 0.0,
+            'visibility': 'visible',
+            'stdout_visibility': 'visible',
+            'tests': []
+            }
 
     write_results_to_file(results, results_filename)
 
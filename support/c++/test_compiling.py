@@ -1,17 +1,51 @@
-from os import popen
-from typing import List, Tuple
+from hashlib import sha256
+from os import makedirs, popen, remove
+from os.path import dirname, exists as path_exists, join as path_join, normpath
+import re
+from typing import Dict, List, Set, Tuple
 
 from attributes import Attributes
-from config import CXX_FLAGS, CXX
+from compile_cache import cached_compile, compile_once
+from config import CXX_BATCH_UNIT_TESTS, CXX_FLAGS, CXX, CXX_MEMORY_ERRORS_FLAGS, CXX_PRECOMPILED_HEADER_MIN_COMPILES, \
+    CXX_PRECOMPILED_HEADERS
 from test_types import UnsupportedTestException
+from test_writing import BATCHED_UNIT_TESTS, BatchedUnitTest, batch_key, precompiled_header_name, write_precompiled_header, \
+    write_unit_test_batch
 
 
-def compile_x_test(name: str, src: List[str] | None = None) -> Tuple[bool,str]:
-    if src:
-        source = ' '.join(src)
-    else:
-        source = f'{name}.cpp'
-    compile_cmd = f'{CXX} {CXX_FLAGS} -o {name} {source} 2>&1'
+# student sources compiled to objects, keyed by (flags, source), as (compiles, output, object)
+COMPILED_OBJECTS: Dict[Tuple[str, str], Tuple[bool, str, str]] = {}
+OBJECTS_DIR = 'objects'
+CXX_SOURCE_EXTENSIONS = ('.c', '.cc', '.cpp', '.cxx', '.c++', '.C')
+
+
+LOCAL_INCLUDE = re.compile(r'^\s*#\s*include\s*"([^"]+)"', re.MULTILINE)
+# a #define (or any other directive) in one test would leak into the tests after it in a batch
+PREPROCESSOR_DIRECTIVE = re.compile(r'^\s*#', re.MULTILINE)
+# a diagnostic about the code of one test in a batch (see write_unit_test_batch)
+BATCHED_TEST_DIAGNOSTIC = re.compile(r'^unit_test_(\d+)\.cpp:')
+# the source, caret, and notes under a diagnostic are about the same thing as it is
+DIAGNOSTIC_CONTINUATION = re.compile(r'^(\s|[^\s:]+:\d+(:\d+)?: note:)')
+
+def local_inputs(sources: List[str]) -> List[str]:
+    # the sources and every local header they (transitively) include
+    inputs: List[str] = []
+    pending = list(sources)
+    while pending:
+        filename = pending.pop()
+        if filename in inputs:
+            continue
+        inputs.append(filename)
+        try:
+            with open(filename, 'r', encoding='utf-8', errors='backslashreplace') as f:
+                content = f.read()
+        except OSError:
+            continue
+        for header in LOCAL_INCLUDE.findall(content):
+            pending.append(normpath(path_join(dirname(filename), header)))
+    return inputs
+
+def run_compile_cmd(compile_cmd: str) -> Tuple[bool,str]:
     p = popen(compile_cmd)
     try:
         output = p.read()
@@ -20,14 +54,165 @@ def compile_x_test(name: str, src: List[str] | None = None) -> Tuple[bool,str]:
     ret = p.close()
     return ret is None, output
 
-def compile_unit_test() -> Tuple[bool,str]:
+def compile_x_test(name: str, src: List[str] | None = None) -> Tuple[bool,str]:
+    if src:
+        source = ' '.join(src)
+    else:
+        source = f'{name}.cpp'
+    compile_cmd = f'{CXX} {CXX_FLAGS} -o {name} {source} 2>&1'
+    return cached_compile(
+        compile_cmd,
+        [CXX, '--version'],
+        local_inputs(source.split()),
+        lambda: run_compile_cmd(compile_cmd),
+        lambda: [name])
+
+def source_files(src: List[str]) -> List[str]:
+    # translation units only (headers are compiled by whatever includes them)
+    return [source for sources in src for source in sources.split() if source.endswith(CXX_SOURCE_EXTENSIONS)]
+
+def compile_object(source: str, flags: str, profile: str) -> Tuple[bool, str, str]:
+    key = (flags, source)
+    if key not in COMPILED_OBJECTS:
+        obj = path_join(OBJECTS_DIR, profile, normpath(source).replace('/', '__') + '.o')
+        makedirs(dirname(obj), exist_ok=True)
+        compile_cmd = f'{CXX} {flags} -c -o {obj} {source} 2>&1'
+        compiles, output = cached_compile(
+            compile_cmd,
+            [CXX, '--version'],
+            local_inputs([source]),
+            lambda: run_compile_cmd(compile_cmd),
+            lambda: [obj])
+        COMPILED_OBJECTS[key] = (compiles, output, obj)
+    return COMPILED_OBJECTS[key]
+
+def link_x_test(name: str, src: List[str], flags: str, profile: str) -> Tuple[bool,str]:
+    objects = []
+    compile_output = ''
+    all_compile = True
+    for source in source_files(src):
+        compiles, output, obj = compile_object(source, flags, profile)
+        all_compile = all_compile and compiles
+        compile_output += output
+        objects.append(obj)
+    if not all_compile:
+        return False, compile_output
+
+    link_cmd = f'{CXX} {flags} -o {name} {" ".join(objects)} 2>&1'
+    links, output = cached_compile(
+        link_cmd,
+        [CXX, '--version'],
+        objects,
+        lambda: run_compile_cmd(link_cmd),
+        lambda: [name])
+    return links, compile_output + output
+
+def compile_shared_objects(tests: List[Attributes]) -> None:
+    # in the testbox, so every test (and sandbox) shares the same objects and executables
+    for test in tests:
+        if test['type'] == 'i/o':
+            compile_io_test([test['target'], test['include']])
+        elif test['type'] == 'memory_errors':
+            for source in source_files(test['approved_includes']):
+                compile_object(source, CXX_MEMORY_ERRORS_FLAGS, 'memory_errors')
+
+def batchable(test: Attributes) -> bool:
+    return CXX_BATCH_UNIT_TESTS and test['type'] == 'unit' and not PREPROCESSOR_DIRECTIVE.search(test['code'])
+
+def split_batch_compile_output(output: str, cases: int) -> List[str]:
+    # each test gets the diagnostics about its own code, and those about what every test includes
+    outputs = [''] * cases
+    owner = None
+    for line in output.splitlines(keepends=True):
+        if not DIAGNOSTIC_CONTINUATION.match(line):
+            match = BATCHED_TEST_DIAGNOSTIC.match(line)
+            owner = int(match[1]) if match and int(match[1]) < cases else None
+        if owner is None:
+            for case in range(cases):
+                outputs[case] += line
+        else:
+            outputs[owner] += line.replace(f'unit_test_{owner}.cpp:', 'unit_test.cpp:', 1)
+    return outputs
+
+def compile_precompiled_headers(tests: List[Attributes]) -> None:
+    # how many compiles include each header (all the unit tests in a batch are one)
+    compile_counts: Dict[str, int] = {}
+    batched: Set[str] = set()
+    for test in tests:
+        if test['type'] in ('unit', 'performance'):
+            header = precompiled_header_name(test)
+            if batchable(test):
+                if header in batched:
+                    continue
+                batched.add(header)
+            compile_counts[header] = compile_counts.get(header, 0) + 1
+
+    for test in tests:
+        if test['type'] not in ('unit', 'performance'):
+            continue
+        header = precompiled_header_name(test)
+        if compile_counts.pop(header, 0) < CXX_PRECOMPILED_HEADER_MIN_COMPILES:
+            # not worth it: tests include their headers directly
+            continue
+        write_precompiled_header(test)
+        compile_cmd = f'{CXX} {CXX_FLAGS} -x c++-header -o {header}.gch {header} 2>&1'
+        compiles, _ = cached_compile(
+            compile_cmd,
+            [CXX, '--version'],
+            local_inputs([header]),
+            lambda: run_compile_cmd(compile_cmd),
+            lambda: [f'{header}.gch'])
+        if not compiles:
+            # tests will include their headers directly, as usual
+            print(f'[INFO] failed to precompile {header}, compiling tests without it')
+            if path_exists(f'{header}.gch'):
+                remove(f'{header}.gch')
+
+def compile_unit_test_batches(tests: List[Attributes]) -> None:
+    # tests that include the same files can share a translation unit
+    groups: Dict[Tuple[str, str], List[Attributes]] = {}
+    for test in tests:
+        if batchable(test):
+            groups.setdefault((test['target'], test['include']), []).append(test)
+
+    for index, group in enumerate(groups.values()):
+        name = f'unit_test_batch_{index}'
+        write_unit_test_batch(f'{name}.cpp', group)
+        compiles, output = compile_x_test(name)
+        if not compiles:
+            # fall back to compiling each test on its own, so a broken test fails only itself
+            print(f'[INFO] {len(group)} unit tests failed to compile as a batch, compiling them one at a time')
+            continue
+        outputs = split_batch_compile_output(output, len(group))
+        for case, test in enumerate(group):
+            BATCHED_UNIT_TESTS[batch_key(test)] = BatchedUnitTest(name, case, outputs[case])
+
+def unit_test_command(test: Attributes) -> List[str]:
+    batch = BATCHED_UNIT_TESTS.get(batch_key(test))
+    if batch:
+        return [f'./{batch.executable}', '--case', str(batch.case)]
+    return ["./unit_test", "2>&1"]
+
+def compile_unit_test(test: Attributes) -> Tuple[bool,str]:
+    batch = BATCHED_UNIT_TESTS.get(batch_key(test))
+    if batch:
+        return True, batch.compile_output
     return compile_x_test('unit_test')
 
 def compile_performance_test() -> Tuple[bool,str]:
     return compile_x_test('performance_test')
 
+def io_test_executable(src: List[str]) -> str:
+    # one executable per distinct set of sources
+    key = sha256(' '.join(source_files(src)).encode('utf-8')).hexdigest()[:12]
+    return f'io_test_{key}'
+
+def io_test_command(test: Attributes) -> List[str]:
+    return [f"./{io_test_executable([test['target'], test['include']])}"]
+
 def compile_io_test(src: List[str]) -> Tuple[bool,str]:
-    return compile_x_test('io_test', src)
+    name = io_test_executable(src)
+    return compile_once(src, lambda src: link_x_test(name, src, CXX_FLAGS, 'default'), name)
 
 def compile_script_test() -> Tuple[bool,str]:
     return True, ""
@@ -42,14 +227,22 @@ def compile_compile_test() -> Tuple[bool,str]:
     return True, ""
 
 def compile_memory_errors_test(src: List[str]) -> Tuple[bool,str]:
-    return compile_x_test('memory_error_test', src)
+    # memory_errors.sh runs this instead of compiling the sources itself
+    return link_x_test('memory_error_test', src, CXX_MEMORY_ERRORS_FLAGS, 'memory_errors')
+
 
+def precompile_tests(tests: List[Attributes]) -> None:
+    if CXX_PRECOMPILED_HEADERS:
+        compile_precompiled_headers(tests)
+    if CXX_BATCH_UNIT_TESTS:
+        compile_unit_test_batches(tests)
+    compile_shared_objects(tests)
 
 def compile_test(test: Attributes) -> Tuple[bool, str]:
     compiles = False
     compile_output = ''
     if test['type'] == 'unit':
-        compiles, compile_output = compile_unit_test()
+        compiles, compile_output = compile_unit_test(test)
     elif test['type'] == 'i/o':
         compiles, compile_output = compile_io_test([test['target'], test['include']])
     elif test['type'] == 'script':
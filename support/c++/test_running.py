@@ -1,28 +1,28 @@
 from os.path import exists as path_exists
 from os import remove
-import subprocess
 from time import time
-from typing import Tuple
+from typing import List, Tuple
 from attributes import Attributes
 
 from config import TIMEOUT_MSSG
+from io_testing import run_io_test
+from process_control import run_process
 from results import PartialTestResult
+from test_compiling import io_test_command, unit_test_command
 from test_types import UnsupportedTestException
 
 
-def run_unit_test(timeout: float) -> Tuple[bool,str]:
-    run_cmd = ["./unit_test", "2>&1"]
-    p = subprocess.Popen(run_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+def run_unit_test(timeout: float, run_cmd: List[str]) -> Tuple[bool,str]:
     try:
-        output_en, _ = p.communicate(timeout=timeout)
-        output = output_en.decode(encoding = 'utf-8', errors = 'backslashreplace')
-    except subprocess.TimeoutExpired:
-        output = TIMEOUT_MSSG
-        return False, output
+        result = run_process(run_cmd, timeout)
     except Exception as e:
         output = str(e)
         return False, output
-    ret = p.returncode
+    if result.timed_out:
+        output = TIMEOUT_MSSG + result.kill_reason
+        return False, output
+    output = result.stdout.decode(encoding = 'utf-8', errors = 'backslashreplace')
+    ret = result.returncode
     if ret == -8:
         output += '\nFloating point exception (core dumped)'
     elif ret == -11:
@@ -33,17 +33,16 @@ def run_unit_test(timeout: float) -> Tuple[bool,str]:
 
 def run_performance_test(timeout: float) -> Tuple[bool,str]:
     run_cmd = ["./performance_test", "2>&1"]
-    p = subprocess.Popen(run_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     try:
-        output_en, _ = p.communicate(timeout=timeout)
-        output = output_en.decode(encoding = 'utf-8', errors = 'backslashreplace')
-    except subprocess.TimeoutExpired:
-        output = TIMEOUT_MSSG
-        return False, output
+        result = run_process(run_cmd, timeout)
     except Exception as e:
         output = str(e)
         return False, output
-    ret = p.returncode
+    if result.timed_out:
+        output = TIMEOUT_MSSG + result.kill_reason
+        return False, output
+    output = result.stdout.decode(encoding = 'utf-8', errors = 'backslashreplace')
+    ret = result.returncode
     if ret == -8:
         output += '\nFloating point exception (core dumped)'
     elif ret == -11:
@@ -52,44 +51,6 @@ def run_performance_test(timeout: float) -> Tuple[bool,str]:
         output += f"\nProgram exited with status {ret} (crashed?)"
     return ret == 0, output
 
-def remove_end_of_line_whitespace(s: str) -> str:
-    lines = s.split('\n')
-    lines = [line.rstrip() for line in lines]
-    return '\n'.join(lines)
-
-
-def run_io_test(timeout: float) -> Tuple[bool,str]:
-    run_cmd = ["./io_test"]
-    with open('input.txt', 'r', encoding='utf-8') as file:
-        input_data = file.read()
-    p = subprocess.Popen(run_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    output_str = ""
-    gt_string = ""
-    message_to_student = ""
-
-    try:
-        output, _ = p.communicate(input_data.encode('utf-8'), timeout=timeout)
-        output_str = output.decode(encoding = 'utf-8', errors = 'backslashreplace').rstrip()
-
-        with open('output.txt', 'r', encoding='utf-8') as file:
-            gt_string = file.read().replace('\r', '').rstrip()
-
-        gt_string = remove_end_of_line_whitespace(gt_string)
-        output_str = remove_end_of_line_whitespace(output_str)
-
-        message_to_student += f"The input:\n{input_data.rstrip()}\n\n"
-        message_to_student += f"Your output:\n{output_str}\n\n"
-        message_to_student += f"Expected output:\n{gt_string}\n\n"
-
-    except subprocess.TimeoutExpired:
-        output_str = TIMEOUT_MSSG
-        message_to_student += output_str
-    except Exception as e:
-        output_str = str(e)
-        message_to_student += output_str
-
-    return (output_str == gt_string), message_to_student
 
 def run_script_test(timeout: float, args: str = '') -> Tuple[bool,str,float]:
 
@@ -99,27 +60,27 @@ def run_script_test(timeout: float, args: str = '') -> Tuple[bool,str,float]:
         remove('./OUTPUT')
 
     cmd = f'bash ./script.sh {args}'
-    p = subprocess.Popen(cmd, stdin=subprocess.PIPE, shell=True)
     score = 0.0
     debug_string = ""
     output_string = "0"
-    try:
-        _, _ = p.communicate(timeout=timeout)
+    # the script's output goes straight to the log
+    result = run_process(cmd, timeout, capture=False, shell=True)
+    if result.timed_out:
+        debug_string = TIMEOUT_MSSG + result.kill_reason
+        return False, debug_string, score
 
-        if path_exists('./OUTPUT'):
-            with open('./OUTPUT', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
-                output_string = file.read()
-        else:
-            print('[FATAL]: OUTPUT does not exist.')
-            return False, "test failed to run", 0
+    if path_exists('./OUTPUT'):
+        with open('./OUTPUT', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
+            output_string = file.read()
+    else:
+        print('[FATAL]: OUTPUT does not exist.')
+        return False, "test failed to run", 0
 
-        if path_exists('./DEBUG'):
-            with open('./DEBUG', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
-                debug_string = "Debug:\n" + file.read()
+    if path_exists('./DEBUG'):
+        with open('./DEBUG', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
+            debug_string = "Debug:\n" + file.read()
 
-        score = float(output_string)
-    except subprocess.TimeoutExpired:
-        debug_string = TIMEOUT_MSSG
+    score = float(output_string)
 
     return (score > 0.0), debug_string, score
 
@@ -144,9 +105,9 @@ def run_test(test: Attributes) -> PartialTestResult:
     timeout = float(test['timeout'])
     time_start = time()
     if test['type'] == 'unit':
-        runs, run_output = run_unit_test(timeout)
+        runs, run_output = run_unit_test(timeout, unit_test_command(test))
     elif test['type'] == 'i/o':
-        runs, run_output = run_io_test(timeout)
+        runs, run_output = run_io_test(timeout, io_test_command(test), test['output_file'], test['compare'])
     elif test['type'] == 'script':
         runs, run_output, point_multiplier = run_script_test(timeout, test['script_args'])
     elif test['type'] == 'performance':
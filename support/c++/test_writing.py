@@ -1,39 +1,127 @@
 '''write tests for c++'''
+from dataclasses import dataclass
+from hashlib import sha256
+from io import StringIO
+from os.path import exists as path_exists
+from typing import Dict, List, TextIO, Tuple
 from attributes import Attributes
+from fixtures import copy_text_file
 from test_types import UnsupportedTestException
 
-def write_unit_test(test: Attributes) -> None:
-    with open('unit_test.cpp', 'wt', encoding='utf-8') as f:
+
+@dataclass
+class BatchedUnitTest:
+    '''
+    Where to find a unit test that was compiled as part of a batch
+    '''
+    executable: str
+    case: int
+    compile_output: str
+
+# unit tests that were compiled together, keyed by (target, include, code)
+BATCHED_UNIT_TESTS: Dict[Tuple[str, str, str], BatchedUnitTest] = {}
+
+def batch_key(test: Attributes) -> Tuple[str, str, str]:
+    return test['target'], test['include'], test['code']
+
+def precompiled_header_name(test: Attributes) -> str:
+    # one header per distinct target and include list
+    key = sha256(f"{test['target']}\n{test['include']}".encode('utf-8')).hexdigest()[:12]
+    return f'test_harness_{key}.h'
+
+def has_precompiled_header(test: Attributes) -> bool:
+    return path_exists(f'{precompiled_header_name(test)}.gch')
+
+# Writes a header with everything that unit and performance tests include, to be precompiled
+def write_precompiled_header(test: Attributes) -> str:
+    filename = precompiled_header_name(test)
+    with open(filename, 'wt', encoding='utf-8') as f:
         f.write(f"#include \"{test['target']}\"\n\n")
+        f.write('#include <iostream>\n')
+        f.write('#include <chrono>\n')
         if test['include']:
             for include in test['include'].split():
                 f.write(f'#include {include}\n')
-        f.write('#include "cs12x_test.h"\n\n')
+        f.write('#include "cs12x_test.h"\n')
+    return filename
 
-        f.write('int main() {\n')
-        f.write('    INIT_TEST;\n')
-        f.write('    try {\n')
-        f.write('        {}\n'.format('\n        '.join(test['code'].splitlines())))
-        f.write('    } catch (const std::exception& err) {\n')
-        f.write('        std::cout << "Caught unexpected std::exception, what: " << err.what() << std::endl;')
-        f.write('        FAIL();\n')
-        f.write('    } catch (...) {\n')
-        f.write('        std::cout << "Caught unexpected non-std::exception" << std::endl;\n')
-        f.write('        FAIL();\n')
+def write_unit_test_includes(f: TextIO, test: Attributes) -> None:
+    if has_precompiled_header(test):
+        f.write(f'#include "{precompiled_header_name(test)}"\n\n')
+        return
+    f.write(f"#include \"{test['target']}\"\n\n")
+    if test['include']:
+        for include in test['include'].split():
+            f.write(f'#include {include}\n')
+    f.write('#include "cs12x_test.h"\n\n')
+
+def write_unit_test_function(f: TextIO, name: str, test: Attributes) -> None:
+    f.write(f'int {name}() {{\n')
+    f.write('    INIT_TEST;\n')
+    f.write('    try {\n')
+    f.write('        {}\n'.format('\n        '.join(test['code'].splitlines())))
+    f.write('    } catch (const std::exception& err) {\n')
+    f.write('        std::cout << "Caught unexpected std::exception, what: " << err.what() << std::endl;')
+    f.write('        FAIL();\n')
+    f.write('    } catch (...) {\n')
+    f.write('        std::cout << "Caught unexpected non-std::exception" << std::endl;\n')
+    f.write('        FAIL();\n')
+    f.write('    }\n')
+    f.write('    RESULT(pass);\n')
+    f.write('    return pass ? 0 : 1;\n')
+    f.write('}\n')
+
+def write_unit_test(test: Attributes) -> None:
+    if batch_key(test) in BATCHED_UNIT_TESTS:
+        # already written (and compiled) as part of a batch
+        return
+    with open('unit_test.cpp', 'wt', encoding='utf-8') as f:
+        write_unit_test_includes(f, test)
+        write_unit_test_function(f, 'main', test)
+
+# Writes every test into one translation unit, selected at run time with --case <number>.
+# each test is a main() of its own namespace, so __FUNCTION__ still says main
+def write_unit_test_batch(filename: str, tests: List[Attributes]) -> None:
+    includes = StringIO()
+    write_unit_test_includes(includes, tests[0])
+    # report the same line numbers as the test would have in its own unit_test.cpp,
+    # in a file named for its case, so the compile output can be split up by test
+    first_line = includes.getvalue().count('\n') + 1
+
+    with open(filename, 'wt', encoding='utf-8') as f:
+        f.write(includes.getvalue())
+
+        for case, test in enumerate(tests):
+            f.write(f'namespace unit_test_{case} {{\n')
+            f.write(f'#line {first_line} "unit_test_{case}.cpp"\n')
+            write_unit_test_function(f, 'main', test)
+            f.write('}\n\n')
+
+        f.write('int main(int argc, char* argv[]) {\n')
+        f.write('    if (argc != 3 || std::string(argv[1]) != "--case") {\n')
+        f.write('        std::cout << "usage: " << argv[0] << " --case <number>" << std::endl;\n')
+        f.write('        return 2;\n')
         f.write('    }\n')
-        f.write('    RESULT(pass);\n')
-        f.write('    return pass ? 0 : 1;\n')
+        f.write('    switch (std::stoi(argv[2])) {\n')
+        for case in range(len(tests)):
+            f.write(f'        case {case}: return unit_test_{case}::main();\n')
+        f.write('    }\n')
+        f.write('    std::cout << "unknown case: " << argv[2] << std::endl;\n')
+        f.write('    return 2;\n')
         f.write('}\n')
 
 def write_performance_test(test: Attributes) -> None:
     with open('performance_test.cpp', 'wt', encoding='utf-8') as f:
-        f.write(f"#include \"{test['target']}\"\n\n")
-        f.write('#include <iostream>\n')
-        f.write('#include <chrono>\n')
-        if test['include']:
-            for include in test['include'].split():
-                f.write(f'#include {include}\n')
-        f.write('#include "cs12x_test.h"\n\n')
+        if has_precompiled_header(test):
+            f.write(f'#include "{precompiled_header_name(test)}"\n\n')
+        else:
+            f.write(f"#include \"{test['target']}\"\n\n")
+            f.write('#include <iostream>\n')
+            f.write('#include <chrono>\n')
+            if test['include']:
+                for include in test['include'].split():
+                    f.write(f'#include {include}\n')
+            f.write('#include "cs12x_test.h"\n\n')
 
         f.write('int main() {\n')
         f.write('    INIT_TEST;\n')
@@ -54,15 +142,14 @@ def write_performance_test(test: Attributes) -> None:
         f.write('    return pass ? 0 : 1;\n')
         f.write('}\n')
 
-# Writes out the input and output strings
+# Writes out the input (the expected output is read from its file when the test runs)
 def write_io_test(test: Attributes) -> None:
-    with open('input.txt', 'wt', encoding='utf-8') as f:
-        f.write(test['expected_input'])
-        f.write("\n")
-    with open('output.txt', 'wt', encoding='utf-8') as f:
-        f.write(test['expected_output'])
+    copy_text_file(test['input_file'], 'input.txt', "\n")
 
 def write_script_test(test: Attributes) -> None:
+    if test['script_file']:
+        copy_text_file(test['script_file'], 'script.sh')
+        return
     with open('script.sh', 'wt', encoding='utf-8') as f:
         f.write(test['script_content'])
 
@@ -79,7 +166,10 @@ def write_compile_test(test: Attributes) -> None:
     write_script_test(test)
 
 def write_memory_errors_test(test: Attributes) -> None:
-    test['script_content'] = f"./memory_errors.sh {' '.join(test['approved_includes'])}"
+    # memory_errors.sh runs the executable built by compile_memory_errors_test
+    test['script_content'] = (
+        "MEMORY_ERROR_TEST=./memory_error_test "
+        f"./memory_errors.sh {' '.join(test['approved_includes'])}")
     write_script_test(test)
 
 def write_test(test: Attributes) -> None:
@@ -1,24 +1,47 @@
 import subprocess
+from hashlib import sha256
+from os.path import exists as path_exists
 
 from attributes import Attributes
+from compile_cache import cached_compile, compile_once
 from test_types import UnsupportedTestException
 
 
+def run_compile_args(args: list[str]) -> tuple[bool,str]:
+    result = subprocess.run(args, capture_output=True, text=True, check=False)
+    return result.returncode == 0, result.stdout + '\n' + result.stderr
+
 def compile_x_test(name: str, src: list[str] | None = None) -> tuple[bool,str]:
     if src:
         args = ['go', 'build', '-o', name] + src
     else:
         args = ['go', 'build', '-o', name, f"{name}.go"]
-    result = subprocess.run(args, capture_output=True, text=True, check=False)
-    return result.returncode == 0, result.stdout + '\n' + result.stderr
+    # module files change how the sources build, too
+    inputs = args[4:] + [filename for filename in ('go.mod', 'go.sum') if path_exists(filename)]
+    return cached_compile(
+        ' '.join(args),
+        ['go', 'version'],
+        inputs,
+        lambda: run_compile_args(args),
+        lambda: [name])
 
 def compile_unit_test() -> tuple[bool,str]:
     # we don't need to compile unit tests, we just run them with `go test``
     return True, ''
     # return compile_x_test('unittest')  # name of executable == name of source (unittest.go)
 
+def io_test_executable(src: list[str]) -> str:
+    # one executable per distinct set of sources
+    key = sha256(' '.join(src).encode('utf-8')).hexdigest()[:12]
+    return f'io_test_{key}'
+
+def io_test_command(test: Attributes) -> list[str]:
+    return [f"./{io_test_executable(test['target'].split(' '))}"]
+
 def compile_io_test(src: list[str]) -> tuple[bool,str]:
-    return compile_x_test('io_test', src)  # name of executable and explicit list of source files
+    name = io_test_executable(src)
+    # name of executable and explicit list of source files
+    return compile_once(src, lambda src: compile_x_test(name, src), name)
 
 def compile_script_test() -> tuple[bool,str]:
     return True, ''
@@ -32,6 +55,12 @@ def compile_coverage_test() -> tuple[bool,str]:
 def compile_compile_test() -> tuple[bool,str]:
     return True, ''
 
+def precompile_tests(tests: list[Attributes]) -> None:
+    # in the testbox, so every test (and sandbox) shares the same executables
+    for test in tests:
+        if test['type'] == 'i/o':
+            compile_io_test(test['target'].split(' '))
+
 def compile_test(test: Attributes) -> tuple[bool, str]:
     compiles = False
     compile_output = ''
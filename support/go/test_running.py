@@ -2,35 +2,18 @@
 methods for running tests for go programs
 '''
 
-import subprocess
 from os import remove
 from os.path import exists as path_exists
 from time import time
-import difflib
 
 from attributes import Attributes
 from results import PartialTestResult
 from config import TIMEOUT_MSSG
+from io_testing import run_io_test
+from process_control import run_process
+from test_compiling import io_test_command
 from test_types import UnsupportedTestException
 
-def communicate_with_subprocess(p: subprocess.Popen[bytes], timeout: float, input_data: str = '') -> tuple[str, str]:
-    '''
-    Send input to a subprocess through stdin and get stdout and stderr.
-
-    Args:
-        p (subprocess.Popen[bytes]): subprocess with which to communicate
-        timeout (float): time limit on subprocess
-        input_data (str, optional): data to send. Defaults to ''.
-
-    Returns:
-        tuple[str, str]: contents of stdout, stderr
-    '''
-    output, error = p.communicate(input_data.encode('utf-8'), timeout=timeout)
-    return (
-        output.decode(encoding = 'utf-8', errors = 'backslashreplace'),
-        error.decode(encoding = 'utf-8', errors = 'backslashreplace')
-    )
-
 def run_unit_test(timeout: float, targets: str) -> tuple[bool,str]:
     '''
     run a unit test
@@ -41,21 +24,18 @@ def run_unit_test(timeout: float, targets: str) -> tuple[bool,str]:
     Returns:
         tuple[bool,str]: exited-with-code-0, output
     '''
-    try:
-        result = subprocess.run(['go', 'test', 'unittest.go'] + targets.split(' '), capture_output=True, text=False, check=True, timeout=timeout)
-    except subprocess.CalledProcessError as err:
+    result = run_process(['go', 'test', 'unittest.go'] + targets.split(' '), timeout)
+    if result.timed_out:
+        return False, TIMEOUT_MSSG + result.kill_reason
+
+    output = result.stdout.decode(encoding = 'utf-8', errors = 'backslashreplace')
+    error = result.stderr.decode(encoding = 'utf-8', errors = 'backslashreplace')
+    ret = result.returncode
+    if ret != 0:
         # non-zero exit code
-        output = err.stdout.decode(encoding = 'utf-8', errors = 'backslashreplace')
-        error = err.stderr.decode(encoding = 'utf-8', errors = 'backslashreplace')
-        ret = err.returncode
         if ret not in (0, 1):
             error += '\n' + f"Program exited with status {ret}."
         return False, output + '\n' + error
-    except subprocess.TimeoutExpired:
-        return False, TIMEOUT_MSSG
-
-    output = result.stdout.decode(encoding = 'utf-8', errors = 'backslashreplace')
-    error = result.stderr.decode(encoding = 'utf-8', errors = 'backslashreplace')
     return True, output
 
 def remove_end_of_line_whitespace(s: str) -> str:
@@ -73,55 +53,6 @@ def remove_end_of_line_whitespace(s: str) -> str:
     lines = [line.rstrip() for line in lines]
     return '\n'.join(lines)
 
-def run_io_test(timeout: float) -> tuple[bool,str]:
-    '''
-    run an i/o test.
-
-    Args:
-        timeout (float): how long to wait before test times out
-
-    Returns:
-        tuple[bool,str]: exited-with-code-0, output
-    '''
-    with open('input.txt', 'r', encoding='utf-8') as file:
-        input_data = file.read()
-    try:
-        result = subprocess.run(
-            ['./io_test'],
-            input=input_data.encode('utf-8'),
-            capture_output=True,
-            text=False,
-            check=True,
-            timeout=timeout)
-    except subprocess.CalledProcessError as err:
-        # non-zero exit code
-        output = err.stdout.decode(encoding = 'utf-8', errors = 'backslashreplace')
-        error = err.stderr.decode(encoding = 'utf-8', errors = 'backslashreplace')
-        ret = err.returncode
-        if ret not in (0, 1):
-            error += '\n' + f"Program exited with status {ret}."
-        return False, output + '\n' + error
-    except subprocess.TimeoutExpired as err:
-        # why does TimeoutExpired allow stdout and stderr to be None?!
-        if err.stdout is None:
-            err.stdout = b''
-        if err.stderr is None:
-            err.stderr = b''
-        output = err.stdout.decode(encoding = 'utf-8', errors = 'backslashreplace')
-        error = err.stderr.decode(encoding = 'utf-8', errors = 'backslashreplace')
-        return False, output + '\n' + error + '\n' + TIMEOUT_MSSG
-
-    output = result.stdout.decode(encoding = 'utf-8', errors = 'backslashreplace')
-    error = result.stderr.decode(encoding = 'utf-8', errors = 'backslashreplace')
-
-    with open('output.txt', 'r', encoding='utf-8') as file:
-        reference_output = file.read()
-
-    if output == reference_output:
-        return True, 'Actual output matches expected output.'
-    diff = ''.join(difflib.Differ().compare(reference_output.splitlines(True), output.splitlines(True)))
-    return False, f"Actual output differs from expected output.\n\nThe input:\n{input_data}\n\nThe differences between expected and actual:\n{diff}\n\n"
-
 def run_script_test(timeout: float, args: str = '') -> tuple[bool,str,float]:
     '''
     run a scripted test.
@@ -140,27 +71,27 @@ def run_script_test(timeout: float, args: str = '') -> tuple[bool,str,float]:
         remove('./OUTPUT')
 
     cmd = f'bash ./script.sh {args}'
-    p = subprocess.Popen(cmd, stdin=subprocess.PIPE, shell=True)
     score = 0.0
     debug_string = ""
     output_string = "0"
-    try:
-        _, _ = p.communicate(timeout=timeout)
+    # the script's output goes straight to the log
+    result = run_process(cmd, timeout, capture=False, shell=True)
+    if result.timed_out:
+        debug_string = TIMEOUT_MSSG + result.kill_reason
+        return False, debug_string, score
 
-        if path_exists('./OUTPUT'):
-            with open('./OUTPUT', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
-                output_string = file.read()
-        else:
-            print('[FATAL]: OUTPUT does not exist.')
-            return False, "test failed to run", 0
+    if path_exists('./OUTPUT'):
+        with open('./OUTPUT', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
+            output_string = file.read()
+    else:
+        print('[FATAL]: OUTPUT does not exist.')
+        return False, "test failed to run", 0
 
-        if path_exists('./DEBUG'):
-            with open('./DEBUG', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
-                debug_string = "Debug:\n" + file.read()
+    if path_exists('./DEBUG'):
+        with open('./DEBUG', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
+            debug_string = "Debug:\n" + file.read()
 
-        score = float(output_string)
-    except subprocess.TimeoutExpired:
-        debug_string = TIMEOUT_MSSG
+    score = float(output_string)
 
     return (score > 0.0), debug_string, score
 
@@ -184,7 +115,14 @@ def run_test(test: Attributes) -> PartialTestResult:
     if test['type'] == 'unit':
         runs, run_output = run_unit_test(timeout, test['target'])
     elif test['type'] == 'i/o':
-        runs, run_output = run_io_test(timeout)
+        # lines must match exactly, and a program that exits with an error is reported as such
+        runs, run_output = run_io_test(
+            timeout,
+            io_test_command(test),
+            test['output_file'],
+            test['compare'],
+            normalize_exact=False,
+            check_exit_status=True)
     elif test['type'] == 'script':
         runs, run_output, point_multiplier = run_script_test(timeout, test['script_args'])
     elif test['type'] == 'approved_includes':
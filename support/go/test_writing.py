@@ -3,6 +3,7 @@ Write an autograder test in Go.
 '''
 
 from attributes import Attributes
+from fixtures import copy_text_file
 from test_types import UnsupportedTestException
 
 def write_unit_test(test: Attributes) -> None:
@@ -27,7 +28,7 @@ def write_unit_test(test: Attributes) -> None:
         # f.write('}\n')
         f.write(test['code'])
 
-# Writes out the input and output strings
+# Writes out the input (the expected output is read from its file when the test runs)
 def write_io_test(test: Attributes) -> None:
     '''
     Write an io test.
@@ -35,10 +36,7 @@ def write_io_test(test: Attributes) -> None:
     Args:
         test (Attributes): information about the test
     '''
-    with open('input.txt', 'wt', encoding='utf-8') as f:
-        f.write(test['expected_input'])
-    with open('output.txt', 'wt', encoding='utf-8') as f:
-        f.write(test['expected_output'])
+    copy_text_file(test['input_file'], 'input.txt')
 
 def write_script_test(test: Attributes) -> None:
     '''
@@ -47,6 +45,9 @@ def write_script_test(test: Attributes) -> None:
     Args:
         test (Attributes): information about the test
     '''
+    if test['script_file']:
+        copy_text_file(test['script_file'], 'script.sh')
+        return
     with open('script.sh', 'wt', encoding='utf-8') as f:
         f.write(test['script_content'])
 
@@ -1,15 +1,32 @@
-from typing import List, Tuple
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from glob import glob
 from os import popen
+from os.path import getmtime
+from time import time
 
 from attributes import Attributes
-from config import JAVA_CLASSPATH, JAVA_FLAGS, JAVAC
+from compile_cache import cached_compile, compile_once
+from config import JAVA_BATCH_UNIT_TESTS, JAVA_CLASSPATH, JAVA_FLAGS, JAVAC
 from test_types import UnsupportedTestException
+from test_writing import write_unit_test
 
+@dataclass
+class BatchedUnitTest:
+    '''
+    Where to find a unit test that was compiled as part of a batch
+    '''
+    class_name: str
+    compiles: bool
+    compile_output: str
 
-def compile_x_test(src: List[str]) -> Tuple[bool,str]:
-    SRC = ' '.join(src)
+# unit tests compiled in batches, keyed by (target, include, code)
+BATCHED_UNIT_TESTS: Dict[Tuple[str, str, str], BatchedUnitTest] = {}
 
-    compile_cmd = '{} {} {} 2>&1'.format(JAVAC, JAVA_FLAGS, SRC)
+UNIT_TEST_RUNNER = ['UnitTestRunner.java', 'TestRunner.java']
+
+
+def run_compile_cmd(compile_cmd: str) -> Tuple[bool,str]:
     p = popen(compile_cmd)
     try:
         output = p.read()
@@ -18,14 +35,85 @@ def compile_x_test(src: List[str]) -> Tuple[bool,str]:
     ret = p.close()
     return ret == None, output
 
-def compile_unit_test(src: List[str]) -> Tuple[bool,str]:
-    return compile_x_test(src + ['UnitTest.java', 'UnitTestRunner.java', 'TestRunner.java'])
+def class_files_since(start: float) -> List[str]:
+    return [filename for filename in glob('**/*.class', recursive=True) if getmtime(filename) >= start]
+
+def compile_x_test(src: List[str]) -> Tuple[bool,str]:
+    SRC = ' '.join(src)
+
+    compile_cmd = '{} {} {} 2>&1'.format(JAVAC, JAVA_FLAGS, SRC)
+    # javac also compiles any other sources it finds on the classpath
+    inputs = SRC.split() + glob('**/*.java', recursive=True) + \
+        [entry for entry in JAVA_CLASSPATH.split(':') if entry.endswith('.jar')]
+    # allow for coarse file timestamps
+    start = time() - 1
+    return cached_compile(
+        compile_cmd,
+        [JAVAC, '-version'],
+        inputs,
+        lambda: run_compile_cmd(compile_cmd),
+        lambda: class_files_since(start))
+
+def batch_key(test: Attributes) -> Tuple[str, str, str]:
+    return test['target'], test['include'], test['code']
+
+def class_sources(batch: List[Tuple[str, Attributes]]) -> List[str]:
+    return [f'{class_name}.java' for class_name, _ in batch]
+
+def bisect_unit_test_batch(src: List[str], batch: List[Tuple[str, Attributes]], compiles: bool, output: str) -> None:
+    if compiles or len(batch) == 1:
+        for class_name, test in batch:
+            BATCHED_UNIT_TESTS[batch_key(test)] = BatchedUnitTest(class_name, compiles, output)
+        return
+    # pin the errors on the tests that cause them
+    middle = len(batch) // 2
+    for half in (batch[:middle], batch[middle:]):
+        bisect_unit_test_batch(src, half, *compile_x_test(src + UNIT_TEST_RUNNER + class_sources(half)))
+
+def compile_unit_test_batches(tests: List[Attributes]) -> None:
+    # tests of the same files can be compiled together, each as its own class
+    groups: Dict[Tuple[str, str], List[Tuple[str, Attributes]]] = {}
+    count = 0
+    for test in tests:
+        if test['type'] == 'unit':
+            class_name = f'UnitTest_{count}'
+            count += 1
+            write_unit_test(test, class_name)
+            groups.setdefault((test['target'], test['include']), []).append((class_name, test))
+
+    for (target, include), batch in groups.items():
+        src = [target, include]
+        compiles, output = compile_x_test(src + UNIT_TEST_RUNNER + class_sources(batch))
+        if not compiles:
+            base_compiles, base_output = compile_x_test(src + UNIT_TEST_RUNNER)
+            if not base_compiles:
+                # the tests aren't the problem, so don't bother bisecting
+                for class_name, test in batch:
+                    BATCHED_UNIT_TESTS[batch_key(test)] = BatchedUnitTest(class_name, False, base_output)
+                continue
+            print(f"[INFO] {len(batch)} unit tests failed to compile as a batch, finding the ones that don't compile")
+        bisect_unit_test_batch(src, batch, compiles, output)
+
+def unit_test_class(test: Attributes) -> str:
+    batch = BATCHED_UNIT_TESTS.get(batch_key(test))
+    if batch:
+        return batch.class_name
+    return 'UnitTest'
+
+def compile_unit_test(test: Attributes) -> Tuple[bool,str]:
+    batch = BATCHED_UNIT_TESTS.get(batch_key(test))
+    if batch:
+        return batch.compiles, batch.compile_output
+    return compile_x_test([test['target'], test['include'], 'UnitTest.java'] + UNIT_TEST_RUNNER)
 
 def compile_performance_test(src: List[str]) -> Tuple[bool,str]:
     return compile_x_test(src + ['PerformanceTest.java'])
 
 def compile_io_test(src: List[str]) -> Tuple[bool,str]:
-    return compile_x_test(src)
+    sources = ' '.join(src).split()
+    # the class files are still there from the last i/o test of the same program, unless something removed them
+    main_class = f'{sources[0][:-5]}.class' if sources else ''
+    return compile_once(src, compile_x_test, main_class)
 
 def compile_script_test() -> Tuple[bool,str]:
     return True, ""
@@ -42,11 +130,19 @@ def compile_compile_test() -> Tuple[bool,str]:
 def compile_style_test() -> Tuple[bool,str]:
     return True, ""
 
+def precompile_tests(tests: List[Attributes]) -> None:
+    # in the testbox, so every test (and sandbox) shares the same class files
+    if JAVA_BATCH_UNIT_TESTS:
+        compile_unit_test_batches(tests)
+    for test in tests:
+        if test['type'] == 'i/o':
+            compile_io_test([test['target'], test['include']])
+
 def compile_test(test: Attributes) -> Tuple[bool, str]:
     compiles = False
     compile_output = ''
     if test['type'] == 'unit':
-        compiles, compile_output = compile_unit_test([test['target'], test['include']])
+        compiles, compile_output = compile_unit_test(test)
     elif test['type'] == 'i/o':
         compiles, compile_output = compile_io_test([test['target'], test['include']])
     elif test['type'] == 'script':
@@ -1,75 +1,195 @@
 from os.path import exists as path_exists
-from os import remove
+from os import getcwd, getpid, read, remove
+from functools import partial
+from multiprocessing.util import Finalize
+from select import select
+from signal import SIGKILL
+from shutil import rmtree
 import subprocess
+from tempfile import mkdtemp
 from time import time
-from typing import Tuple
+from typing import Callable, List, Optional, Tuple
 from attributes import Attributes
 
-from config import JAVA_CLASSPATH, TIMEOUT_MSSG
+from config import JAVA_CLASSPATH, JAVA_TEST_SERVER, JAVAC, MAX_OUTPUT_BYTES, TIMEOUT_MSSG
+from io_testing import run_io_test
+from process_control import ProcessResult, kill_process_group, run_process, timeout_kill_reason
 from results import PartialTestResult
+from test_compiling import unit_test_class
 from test_types import UnsupportedTestException
 
 
-def remove_end_of_line_whitespace(s: str) -> str:
-    lines = s.split('\n')
-    lines = [line.rstrip() for line in lines]
-    return '\n'.join(lines)
+class TestServer:
+    '''
+    a long-lived JVM that runs tests on request (see TestServer.java).
+    it is started on first use, and restarted after it exits (or is killed after a timeout).
+    '''
+    def __init__(self) -> None:
+        self.process: Optional[subprocess.Popen] = None
+        self.owner = 0
+        self.cwd = ''
+        self.buffer = b''
+        self.classes = ''
+        # the process that compiled the classes (and removes them)
+        self.classes_owner = 0
+        self.disabled = False
 
-def class_name(filename: str) -> str:
-    # convert "Code.java" -> "Code"
-    return filename[:-5]
+    def compile(self) -> bool:
+        # outside of the working directory, so the server doesn't show up in e.g. coverage reports
+        self.classes = mkdtemp(prefix='java-test-server-')
+        self.classes_owner = getpid()
+        compile_cmd = [JAVAC, '-d', self.classes, '-cp', JAVA_CLASSPATH, 'TestServer.java']
+        try:
+            p = subprocess.run(compile_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        except OSError:
+            return False
+        return p.returncode == 0
 
-def run_code(class_name: str, timeout: float) -> Tuple[bool,str]:
-    run_cmd = ["java", "-classpath", JAVA_CLASSPATH, class_name, "2>&1"]
-    p = subprocess.Popen(run_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    try:
-        output_en, _ = p.communicate(timeout=timeout)
-        output = output_en.decode(encoding = 'utf-8', errors = 'backslashreplace')
-    except subprocess.TimeoutExpired:
-        output = TIMEOUT_MSSG
-    except Exception as e:
-        output = str(e)
-    ret = p.returncode
-    return ret == 0, output
+    def start(self) -> bool:
+        if self.owner != getpid():
+            # inherited from the parent process, which owns that JVM
+            self.process = None
+            self.owner = getpid()
+            # atexit doesn't run in worker processes, but this does
+            Finalize(None, self.close, exitpriority=0)
+        if self.process is not None and self.cwd != getcwd():
+            # classes are loaded from the working directory of the JVM
+            self.stop()
+        if self.process is None and not self.disabled:
+            if not self.classes and not self.compile():
+                print('[INFO] failed to start the java test server, running each test in its own JVM')
+                self.disabled = True
+                return False
+            classpath = ':'.join([self.classes] + [entry for entry in JAVA_CLASSPATH.split(':') if entry.endswith('.jar')])
+            self.process = subprocess.Popen(
+                ['java', '-classpath', classpath, 'TestServer'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                start_new_session=True)
+            self.cwd = getcwd()
+            self.buffer = b''
+        return self.process is not None
 
-def run_unit_test(timeout: float) -> Tuple[bool,str]:
-    return run_code('UnitTestRunner', timeout)
+    def stop(self) -> None:
+        if self.process is not None and self.owner == getpid():
+            kill_process_group(self.process)
+            self.process.wait()
+        self.process = None
 
-def run_performance_test(timeout: float) -> Tuple[bool,str]:
-    return run_code('PerformanceTest', timeout)
+    def read(self, size: Optional[int], deadline: float) -> bytes:
+        # read size bytes (or a line, if size is None) from the server
+        assert self.process is not None and self.process.stdout is not None
+        fd = self.process.stdout.fileno()
+        while True:
+            if size is None and b'\n' in self.buffer:
+                line, _, self.buffer = self.buffer.partition(b'\n')
+                return line
+            if size is not None and len(self.buffer) >= size:
+                data, self.buffer = self.buffer[:size], self.buffer[size:]
+                return data
+            remaining = deadline - time()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired('TestServer', 0)
+            ready, _, _ = select([fd], [], [], remaining)
+            if ready:
+                chunk = read(fd, 1 << 16)
+                if not chunk:
+                    raise EOFError('java test server exited')
+                self.buffer += chunk
 
-def run_io_test(timeout: float, main: str) -> Tuple[bool,str]:
-    run_cmd = ["java", "-classpath", ".", class_name(main), "2>&1"]
-    with open('input.txt', 'r', encoding = 'utf-8', errors = 'backslashreplace') as file:
-        input_data = file.read()
-    p = subprocess.Popen(run_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    def run(self, kind: str, class_name: str, input_data: bytes, timeout: float, max_output: int) -> Optional[Tuple[int, bytes]]:
+        '''
+        run the tests in a class (kind junit) or the main of a class (kind main).
+        returns (exit status, output), or None if the server can't run the request.
+        raises subprocess.TimeoutExpired if the request times out.
+        '''
+        if not self.start():
+            return None
+        assert self.process is not None and self.process.stdin is not None
+        deadline = time() + timeout
+        try:
+            self.process.stdin.write(f'{kind} {class_name} {len(input_data)} {max_output}\n'.encode('utf-8') + input_data)
+            self.process.stdin.flush()
+            status, size = self.read(None, deadline).decode('utf-8').split()
+            if status == 'OVERFLOW':
+                # the server stopped it (and exited): rerun it on its own, where it is killed the same way
+                self.stop()
+                return None
+            output = self.read(int(size), deadline)
+        except subprocess.TimeoutExpired:
+            self.stop()
+            raise
+        except (OSError, EOFError, ValueError):
+            # crashed without saying anything (or not even started), so run it the old-fashioned way
+            self.stop()
+            return None
+        if status == 'FALLBACK':
+            return None
+        if status == 'EXIT':
+            # the tests called System.exit()
+            returncode = self.process.wait()
+            self.process = None
+            return returncode, output
+        return int(status), output
 
-    output_str = ""
-    gt_string = ""
-    message_to_student = ""
+    def close(self) -> None:
+        self.stop()
+        if self.classes and self.classes_owner == getpid():
+            rmtree(self.classes, ignore_errors=True)
+            self.classes = ''
 
-    try:
-        output, _ = p.communicate(input_data.encode('utf-8'), timeout=timeout)
-        output_str = output.decode(encoding = 'utf-8', errors = 'backslashreplace').rstrip()
+TEST_SERVER = TestServer()
 
-        with open('output.txt', 'r', encoding = 'utf-8', errors = 'backslashreplace') as file:
-            gt_string = file.read().replace('\r', '').rstrip()
 
-        gt_string = remove_end_of_line_whitespace(gt_string)
-        output_str = remove_end_of_line_whitespace(output_str)
+def class_name(filename: str) -> str:
+    # convert "Code.java" -> "Code"
+    return filename[:-5]
 
-        message_to_student += f"The input:\n{input_data.rstrip()}\n\n"
-        message_to_student += f"Your output:\n{output_str}\n\n"
-        message_to_student += f"Expected output:\n{gt_string}\n\n"
+def communicate(
+        run_cmd: List[str],
+        request: Tuple[str, str],
+        input_file: Optional[str],
+        timeout: float,
+        max_output: int = MAX_OUTPUT_BYTES,
+        on_stdout: Optional[Callable[[bytes], bool]] = None) -> ProcessResult:
+    # request is (kind, class name) for the test server
+    if JAVA_TEST_SERVER:
+        input_data = b''
+        if input_file:
+            with open(input_file, 'rb') as file:
+                input_data = file.read()
+        try:
+            served = TEST_SERVER.run(request[0], request[1], input_data, timeout, max_output)
+        except subprocess.TimeoutExpired:
+            # the server (and everything the test started) was killed
+            return ProcessResult(-SIGKILL, b'', b'', True, timeout_kill_reason(timeout))
+        if served is not None:
+            if on_stdout is not None:
+                on_stdout(served[1])
+            return ProcessResult(served[0], served[1], b'', False, '')
+    # the input streams straight from the file
+    if input_file:
+        with open(input_file, 'rb') as stdin:
+            return run_process(run_cmd, timeout, stdin, max_output=max_output, on_stdout=on_stdout)
+    return run_process(run_cmd, timeout, max_output=max_output, on_stdout=on_stdout)
 
-    except subprocess.TimeoutExpired:
-        output_str = TIMEOUT_MSSG
-        message_to_student += output_str
+def run_code(class_name: str, timeout: float, request: Tuple[str, str], args: List[str] | None = None) -> Tuple[bool,str]:
+    run_cmd = ["java", "-classpath", JAVA_CLASSPATH, class_name] + (args or []) + ["2>&1"]
+    try:
+        result = communicate(run_cmd, request, None, timeout)
     except Exception as e:
-        output_str = str(e)
-        message_to_student += output_str
+        output = str(e)
+        return False, output
+    if result.timed_out:
+        output = TIMEOUT_MSSG + result.kill_reason
+        return False, output
+    output = result.stdout.decode(encoding = 'utf-8', errors = 'backslashreplace')
+    return result.returncode == 0, output
 
-    return (output_str == gt_string), message_to_student
+def run_unit_test(timeout: float, test_class: str) -> Tuple[bool,str]:
+    return run_code('UnitTestRunner', timeout, ('junit', test_class), [test_class])
+
+def run_performance_test(timeout: float) -> Tuple[bool,str]:
+    return run_code('PerformanceTest', timeout, ('main', 'PerformanceTest'))
 
 def run_script_test(timeout: float, args: str = '') -> Tuple[bool,str,float]:
 
@@ -79,27 +199,27 @@ def run_script_test(timeout: float, args: str = '') -> Tuple[bool,str,float]:
         remove('./OUTPUT')
 
     cmd = f'bash ./script.sh {args}'
-    p = subprocess.Popen(cmd, stdin=subprocess.PIPE, shell=True)
     score = 0.0
     debug_string = ""
     output_string = "0"
-    try:
-        _, _ = p.communicate(timeout=timeout)
+    # the script's output goes straight to the log
+    result = run_process(cmd, timeout, capture=False, shell=True)
+    if result.timed_out:
+        debug_string = TIMEOUT_MSSG + result.kill_reason
+        return False, debug_string, score
 
-        if path_exists('./OUTPUT'):
-            with open('./OUTPUT', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
-                output_string = file.read()
-        else:
-            print('[FATAL]: OUTPUT does not exist.')
-            return False, "test failed to run", 0
+    if path_exists('./OUTPUT'):
+        with open('./OUTPUT', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
+            output_string = file.read()
+    else:
+        print('[FATAL]: OUTPUT does not exist.')
+        return False, "test failed to run", 0
 
-        if path_exists('./DEBUG'):
-            with open('./DEBUG', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
-                debug_string = "Debug:\n" + file.read()
+    if path_exists('./DEBUG'):
+        with open('./DEBUG', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
+            debug_string = "Debug:\n" + file.read()
 
-        score = float(output_string)
-    except subprocess.TimeoutExpired:
-        debug_string = TIMEOUT_MSSG
+    score = float(output_string)
 
     return (score > 0.0), debug_string, score
 
@@ -124,9 +244,15 @@ def run_test(test: Attributes) -> PartialTestResult:
     timeout = float(test['timeout'])
     time_start = time()
     if test['type'] == 'unit':
-        runs, run_output = run_unit_test(timeout)
+        runs, run_output = run_unit_test(timeout, unit_test_class(test))
     elif test['type'] == 'i/o':
-        runs, run_output = run_io_test(timeout, test['target'])
+        main = class_name(test['target'])
+        runs, run_output = run_io_test(
+            timeout,
+            ["java", "-classpath", ".", main, "2>&1"],
+            test['output_file'],
+            test['compare'],
+            partial(communicate, request=('main', main)))
     elif test['type'] == 'script':
         runs, run_output, point_multiplier = run_script_test(timeout, test['script_args'])
     elif test['type'] == 'performance':
@@ -1,8 +1,9 @@
 from attributes import Attributes
+from fixtures import copy_text_file
 from test_types import UnsupportedTestException
 
-def write_unit_test(test: Attributes) -> None:
-    with open('UnitTest.java', 'wt') as f:
+def write_unit_test(test: Attributes, class_name: str = 'UnitTest') -> None:
+    with open(f'{class_name}.java', 'wt') as f:
         f.write('import static org.hamcrest.MatcherAssert.assertThat;\n')
         f.write('import static org.hamcrest.Matchers.*;\n')
         f.write('import static org.junit.Assert.assertThrows;\n\n')
@@ -10,7 +11,7 @@ def write_unit_test(test: Attributes) -> None:
         f.write('import junit.framework.TestCase;\n')
         f.write('import org.junit.Test;\n\n')
 
-        f.write('public class UnitTest extends TestCase {\n')
+        f.write('public class {} extends TestCase {{\n'.format(class_name))
         f.write('  @Test\n')
         f.write('  public void testUnit() {\n')
         f.write('    {}\n'.format('\n    '.join(test['code'].splitlines())))
@@ -29,15 +30,14 @@ def write_performance_test(test: Attributes) -> None:
         f.write('  }\n')
         f.write('}\n')
 
-# Writes out the input and output strings
+# Writes out the input (the expected output is read from its file when the test runs)
 def write_io_test(test: Attributes) -> None:
-    with open('input.txt', 'wt') as f:
-        f.write(test['expected_input'])
-        f.write("\n")
-    with open('output.txt', 'wt') as f:
-        f.write(test['expected_output'])
+    copy_text_file(test['input_file'], 'input.txt', "\n")
 
 def write_script_test(test: Attributes) -> None:
+    if test['script_file']:
+        copy_text_file(test['script_file'], 'script.sh')
+        return
     with open('script.sh', 'wt') as f:
         f.write(test['script_content'])
 
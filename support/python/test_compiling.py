@@ -1,5 +1,8 @@
 from typing import List, Tuple
 from attributes import Attributes
 
+def precompile_tests(tests: List[Attributes]) -> None:
+    pass  # nothing is shared between tests
+
 def compile_test(test: Attributes) -> Tuple[bool, str]:
     return True, ""   # it's python
\ No newline at end of file
@@ -1,68 +1,32 @@
-import subprocess
 from time import time
 from typing import Tuple
 from attributes import Attributes
 
 from config import TIMEOUT_MSSG
+from io_testing import run_io_test
+from process_control import run_process
 from results import PartialTestResult
 from test_types import UnsupportedTestException
 
 
-def remove_end_of_line_whitespace(s: str) -> str:
-    lines = s.split('\n')
-    lines = [line.rstrip() for line in lines]
-    return '\n'.join(lines)
-
 def run_code(class_name: str, timeout: float) -> Tuple[bool,str]:
     run_cmd = ["python3", class_name]
-    p = subprocess.Popen(run_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     try:
-        _, output_err = p.communicate(timeout=timeout)
-        output = output_err.decode(encoding = 'utf-8', errors = 'backslashreplace')
-    except subprocess.TimeoutExpired:
-        output = TIMEOUT_MSSG
+        result = run_process(run_cmd, timeout)
     except Exception as e:
         output = str(e)
-    ret = p.returncode
+        return False, output
+    if result.timed_out:
+        output = TIMEOUT_MSSG + result.kill_reason
+        return False, output
+    output = result.stderr.decode(encoding = 'utf-8', errors = 'backslashreplace')
+    ret = result.returncode
     return ret == 0, output
 
 def run_unit_test(timeout: float) -> Tuple[bool,str]:
     return run_code('UnitTest.py', timeout)
 
 
-def run_io_test(timeout: float, main: str) -> Tuple[bool,str]:
-    run_cmd = ["python3", main]
-    with open('input.txt', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
-        input_data = file.read()
-    p = subprocess.Popen(run_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    output_str = ""
-    gt_string = ""
-    message_to_student = ""
-
-    try:
-        output, _ = p.communicate(input_data.encode('utf-8'), timeout=timeout)
-        output_str = output.decode(encoding = 'utf-8', errors = 'backslashreplace').rstrip()
-
-        with open('output.txt', 'r', encoding='utf-8', errors = 'backslashreplace') as file:
-            gt_string = file.read().replace('\r', '').rstrip()
-
-        gt_string = remove_end_of_line_whitespace(gt_string)
-        output_str = remove_end_of_line_whitespace(output_str)
-
-        message_to_student += f"The input:\n{input_data.rstrip()}\n\n"
-        message_to_student += f"Your output:\n{output_str}\n\n"
-        message_to_student += f"Expected output:\n{gt_string}\n\n"
-
-    except subprocess.TimeoutExpired:
-        output_str = TIMEOUT_MSSG
-        message_to_student += output_str
-    except Exception as e:
-        output_str = str(e)
-        message_to_student += output_str
-
-    return (output_str == gt_string), message_to_student
-
 def run_test(test: Attributes) -> PartialTestResult:
     max_points = float(test['points'])
     runs = True
@@ -74,7 +38,7 @@ def run_test(test: Attributes) -> PartialTestResult:
     if test['type'] == 'unit':
         runs, run_output = run_unit_test(timeout)
     elif test['type'] == 'i/o':
-        runs, run_output = run_io_test(timeout, test['target'])
+        runs, run_output = run_io_test(timeout, ["python3", test['target']], test['output_file'], test['compare'])
     else:
         # don't try to run an unsupported test
         raise UnsupportedTestException(test['type'])
@@ -1,4 +1,5 @@
 from attributes import Attributes
+from fixtures import copy_text_file
 from test_types import UnsupportedTestException
 
 def write_unit_test(test: Attributes) -> None:
@@ -20,15 +21,14 @@ def write_unit_test(test: Attributes) -> None:
         f.write('    unittest.main()\n\n')
 
 
-# Writes out the input and output strings
+# Writes out the input (the expected output is read from its file when the test runs)
 def write_io_test(test: Attributes) -> None:
-    with open('input.txt', 'wt', encoding='utf-8') as f:
-        f.write(test['expected_input'])
-        f.write("\n")
-    with open('output.txt', 'wt', encoding='utf-8') as f:
-        f.write(test['expected_output'])
+    copy_text_file(test['input_file'], 'input.txt', "\n")
 
 def write_script_test(test: Attributes) -> None:
+    if test['script_file']:
+        copy_text_file(test['script_file'], 'script.sh')
+        return
     with open('script.sh', 'wt', encoding='utf-8') as f:
         f.write(test['script_content'])
 
@@ -1,5 +1,10 @@
 from typing import List, Tuple
 from attributes import Attributes
+from test_running import start_backends
+
+def precompile_tests(tests: List[Attributes]) -> None:
+    # start the database server before tests are (maybe) spread over worker processes
+    start_backends(tests)
 
 def compile_test(test: Attributes) -> Tuple[bool, str]:
     return True, ""   # it's sql
\ No newline at end of file
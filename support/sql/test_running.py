@@ -1,15 +1,251 @@
-from os.path import exists as path_exists
-from os import remove
+from contextlib import contextmanager
+from hashlib import sha256
+import json
+from os.path import exists as path_exists, join as path_join
+from os import environ, getpid, makedirs, remove, replace
+from multiprocessing.util import Finalize
+import re
+import sqlite3
 import subprocess
-from time import time
-from typing import Tuple
+from time import sleep, time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from attributes import Attributes
+from compile_cache import file_hash
 
-from config import JAVA_CLASSPATH, TIMEOUT_MSSG
+from config import JAVA_CLASSPATH, SQL_BACKEND, SQL_BULK_INSERT_ROWS, SQL_HOST, SQL_PASSWORD, SQL_POOL_SIZE, SQL_SOLUTION_CACHE_DIR, SQL_START_COMMAND, SQL_STARTUP_TIMEOUT, SQL_USER, TIMEOUT_MSSG, \
+    WORKER_ID_VARIABLE
 from results import PartialTestResult
 from test_types import UnsupportedTestException
 import mysql.connector
 
+# the database server is started once per run, and shared by every test.
+# 'error' is empty once the server is up.
+DATABASE_SERVER: Dict[str, str] = {}
+
+def connect(database: str):
+    return mysql.connector.connect(user=SQL_USER, password=SQL_PASSWORD,
+                              host=SQL_HOST,
+                              database=database)
+
+class ConnectionPool:
+    '''
+    idle connections to the database server, reused by every script and statement in the run.
+    '''
+    def __init__(self) -> None:
+        self.idle: List = []
+        self.owner = 0
+
+    def acquire(self, database: str):
+        if self.owner != getpid():
+            # the connections of the parent process aren't ours to use (or close)
+            self.idle = []
+            self.owner = getpid()
+        while self.idle:
+            cnx = self.idle.pop()
+            try:
+                # forget whatever the last user did to the session (variables, temporary tables, ...)
+                if database:
+                    cnx.reset_session()
+                else:
+                    # a fresh session with no default database, like a new connection
+                    cnx.cmd_change_user(username=SQL_USER, password=SQL_PASSWORD)
+            except Exception:
+                # broken (e.g. the server dropped it), so try another one
+                self.discard(cnx)
+                continue
+            if database:
+                try:
+                    cnx.database = database
+                except Exception:
+                    # e.g. the database doesn't exist; not the connection's fault
+                    self.release(cnx)
+                    raise
+            return cnx
+        return connect(database)
+
+    def release(self, cnx) -> None:
+        try:
+            # closing a connection discards uncommitted changes, so a reused one must too
+            cnx.rollback()
+        except Exception:
+            self.discard(cnx)
+            return
+        if len(self.idle) < SQL_POOL_SIZE:
+            self.idle.append(cnx)
+        else:
+            self.discard(cnx)
+
+    def discard(self, cnx) -> None:
+        try:
+            cnx.close()
+        except Exception:
+            pass
+
+CONNECTION_POOL = ConnectionPool()
+
+@contextmanager
+def pooled_connection(database: str) -> Iterator:
+    '''
+    a connection to the given database, returned to the pool afterwards.
+    a connection that was in use when something went wrong is not reused.
+    '''
+    cnx = CONNECTION_POOL.acquire(worker_database(database))
+    try:
+        yield cnx
+    except BaseException:
+        CONNECTION_POOL.discard(cnx)
+        raise
+    CONNECTION_POOL.release(cnx)
+
+def database_is_ready() -> Tuple[bool, str]:
+    try:
+        connect('').close()
+    except Exception as e:
+        return False, str(e)
+    return True, ''
+
+def ensure_database() -> str:
+    '''
+    start the database server (unless it is already up), and wait until it accepts connections.
+    returns why the server isn't running, or '' if it is.
+    '''
+    if 'error' not in DATABASE_SERVER:
+        ready, error = database_is_ready()
+        if not ready:
+            try:
+                p = subprocess.run(SQL_START_COMMAND, capture_output=True, timeout=SQL_STARTUP_TIMEOUT, check=False)
+                error = p.stderr.decode('utf-8', errors='backslashreplace').strip() or error
+            except (OSError, subprocess.TimeoutExpired) as e:
+                error = str(e)
+            deadline = time() + SQL_STARTUP_TIMEOUT
+            while not ready and time() < deadline:
+                ready, probe_error = database_is_ready()
+                if not ready:
+                    error = probe_error
+                    sleep(0.25)
+        DATABASE_SERVER['error'] = '' if ready else f'database server failed to start: {error}\n'
+    return DATABASE_SERVER['error']
+
+
+# names (lowercase) of the databases that tests use.  when tests run in parallel, each worker
+# process uses its own copy of each of them, e.g. CH07_CONSTRUCTCO__w3 in worker 3.
+WORKER_DATABASES: Set[str] = set()
+
+SQL_TOKEN = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`((?:[^`]|``)*)`|([A-Za-z0-9_$]+)", re.DOTALL)
+QUALIFIER_DOT = re.compile(r'\s*\.')
+# in SHOW statements, FROM/IN names a database, except in these, where the first one names a table
+SHOW_TABLE_FIRST = ('columns', 'fields', 'index', 'indexes', 'keys')
+DATABASE_STATEMENT = re.compile(
+    r'(CREATE|DROP)\s+(?:DATABASE|SCHEMA)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?`?([A-Za-z0-9_$]+)', re.IGNORECASE)
+
+def worker_suffix() -> str:
+    worker = environ.get(WORKER_ID_VARIABLE, '')
+    return f'__w{worker}' if worker else ''
+
+def register_databases(names: Iterable[str]) -> None:
+    for name in names:
+        if name:
+            WORKER_DATABASES.add(name.lower())
+
+def worker_database(database: str) -> str:
+    '''
+    the name of this worker's copy of a database.
+    '''
+    suffix = worker_suffix()
+    if suffix and database.lower() in WORKER_DATABASES:
+        return database + suffix
+    return database
+
+def rename_databases(statement: str, suffix: str) -> str:
+    '''
+    add suffix to the names of the databases (in WORKER_DATABASES) in a statement.
+    a name is only a database by where it is: after DATABASE or SCHEMA (and IF [NOT] EXISTS),
+    after USE, after FROM or IN in SHOW, or before the dot in db.table.
+    tables with the same name as a database, and strings, are left alone.
+
+    >>> register_databases(['CH07'])
+    >>> rename_databases('CREATE DATABASE IF NOT EXISTS CH07', '__w1')
+    'CREATE DATABASE IF NOT EXISTS CH07__w1'
+    >>> rename_databases('drop schema `CH07`', '__w1')
+    'drop schema `CH07__w1`'
+    >>> rename_databases('USE CH07', '__w1')
+    'USE CH07__w1'
+    >>> rename_databases('SHOW TABLES FROM CH07', '__w1')
+    'SHOW TABLES FROM CH07__w1'
+    >>> rename_databases('SHOW FULL COLUMNS FROM CH07 IN CH07', '__w1')
+    'SHOW FULL COLUMNS FROM CH07 IN CH07__w1'
+    >>> rename_databases('SELECT * FROM CH07.Employees JOIN CH07 USING (id)', '__w1')
+    'SELECT * FROM CH07__w1.Employees JOIN CH07 USING (id)'
+    >>> rename_databases('DROP TABLE IF EXISTS CH07', '__w1')
+    'DROP TABLE IF EXISTS CH07'
+    >>> rename_databases('CREATE TABLE IF NOT EXISTS CH07 (id INT)', '__w1')
+    'CREATE TABLE IF NOT EXISTS CH07 (id INT)'
+    >>> rename_databases("SELECT DATABASE() = 'CH07' FROM t USE INDEX (CH07)", '__w1')
+    "SELECT DATABASE() = 'CH07' FROM t USE INDEX (CH07)"
+    '''
+    parts = []
+    end = 0
+    # the first word of the statement, and the word right before the current token (if only whitespace is between them)
+    first = ''
+    previous = ''
+    previous_end = 0
+    # the next name is a database (after DATABASE/SCHEMA, once IF [NOT] EXISTS is skipped)
+    after_database = False
+    # FROM/IN seen so far in a SHOW statement that names a table first
+    show_froms = 0
+    show_table_first = False
+    for match in SQL_TOKEN.finditer(statement):
+        quoted, word = match.groups()
+        name = quoted.replace('``', '`') if quoted is not None else word
+        adjacent = not statement[previous_end:match.start()].strip()
+        lower = word.lower() if word is not None else ''
+        if not adjacent:
+            previous = ''
+            after_database = False
+        if after_database and lower in ('if', 'not', 'exists'):
+            previous = lower
+            previous_end = match.end()
+            continue
+        is_database = after_database or \
+            (previous == 'use' and first == 'use') or \
+            (first == 'show' and previous in ('from', 'in') and show_froms > int(show_table_first)) or \
+            QUALIFIER_DOT.match(statement, match.end()) is not None
+        if name is not None and is_database and name.lower() in WORKER_DATABASES:
+            parts.append(statement[end:match.start()])
+            parts.append(f'`{name}{suffix}`' if quoted is not None else f'{name}{suffix}')
+            end = match.end()
+        if not first:
+            first = lower
+        elif first == 'show':
+            if lower in SHOW_TABLE_FIRST and not show_froms:
+                show_table_first = True
+            elif lower in ('from', 'in'):
+                show_froms += 1
+        after_database = lower in ('database', 'schema')
+        previous = lower
+        previous_end = match.end()
+    parts.append(statement[end:])
+    return ''.join(parts)
+
+def to_worker(statement: str) -> str:
+    '''
+    rename the databases in a statement to this worker's copies.
+    '''
+    suffix = worker_suffix()
+    if not suffix or not WORKER_DATABASES:
+        return statement
+    return rename_databases(statement, suffix)
+
+def from_worker(text: str) -> str:
+    '''
+    undo to_worker, in anything shown to students.
+    '''
+    suffix = worker_suffix()
+    if not suffix or not WORKER_DATABASES:
+        return text
+    names = '|'.join(re.escape(name) for name in WORKER_DATABASES)
+    return re.sub(f'(?<![\\w$])({names}){re.escape(suffix)}(?![\\w$])', r'\1', text, flags=re.IGNORECASE)
+
 
 def parse_test(test):
     test_details = {}
@@ -29,69 +265,490 @@ def parse_test(test):
         
     return test_details
 
-def run_script(timeout: float, database:str, filename:str, statement = None, ordered = None):
-    cnx = mysql.connector.connect(user='root', password='',
-                              host='127.0.0.1',
-                              database=database)
+# parsed scripts (content hash -> statements), shared by every test that runs the same script
+PARSED_SCRIPTS: Dict[str, List[str]] = {}
+
+DELIMITER_COMMAND = re.compile(r'delimiter[ \t]+(\S+)[^\n]*', re.IGNORECASE)
+
+def sql_statements(script: str) -> Iterator[str]:
+    '''
+    split a MySQL script into statements, like the mysql client does.
+    comments are removed (except /*! */ and /*+ */, which mean something to the server),
+    delimiters inside strings and comments are ignored, and DELIMITER commands are obeyed.
+    '''
+    delimiter = ';'
+    # the current statement is parts + script[start:i]
+    parts: List[str] = []
+    start = 0
+    # nothing but whitespace (and comments) in the current statement so far
+    blank = True
+    i = 0
+    n = len(script)
+    while i < n:
+        c = script[i]
+        if blank and c in 'dD':
+            command = DELIMITER_COMMAND.match(script, i)
+            if command:
+                delimiter = command.group(1)
+                parts = []
+                i = start = command.end()
+                continue
+        if script.startswith(delimiter, i):
+            parts.append(script[start:i])
+            statement = ''.join(parts).strip()
+            if statement:
+                yield statement
+            parts = []
+            blank = True
+            i = start = i + len(delimiter)
+            continue
+        if c in '\'"`':
+            # skip to the closing quote (doubled quotes and, except in identifiers, backslashes escape)
+            i += 1
+            while i < n:
+                if script[i] == '\\' and c != '`' or script.startswith(c * 2, i):
+                    i += 2
+                elif script[i] == c:
+                    break
+                else:
+                    i += 1
+            i += 1
+            blank = False
+            continue
+        if c == '#' or (script.startswith('--', i) and (i + 2 == n or script[i + 2].isspace())):
+            parts.append(script[start:i])
+            end = script.find('\n', i)
+            i = start = n if end == -1 else end
+            continue
+        if script.startswith('/*', i):
+            end = script.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            if script.startswith('/*!', i) or script.startswith('/*+', i):
+                blank = False
+            else:
+                parts.append(script[start:i] + ' ')
+                start = end
+            i = end
+            continue
+        if not c.isspace():
+            blank = False
+        i += 1
+    parts.append(script[start:])
+    statement = ''.join(parts).strip()
+    if statement:
+        yield statement
+
+def script_statements(filename: str) -> List[str]:
+    key = file_hash(filename)
+    if key not in PARSED_SCRIPTS:
+        with open(filename, 'r', encoding='utf-8') as file:
+            PARSED_SCRIPTS[key] = list(sql_statements(file.read()))
+        register_databases(match.group(2) for match in map(DATABASE_STATEMENT.match, PARSED_SCRIPTS[key]) if match)
+    return PARSED_SCRIPTS[key]
 
+def run_script(timeout: float, database:str, filename:str, statement = None, ordered = None):
     results = []
-    f = open(filename)
-    lines = f.read().split('\n')
-    for i in range(len(lines)):
-        start = lines[i].find('-- ')
-        if start != -1:
-            lines[i] = lines[i][:start]
-    
-    new_lines = ""
-    for l in lines:
-        new_lines = new_lines + ' ' + l
-    stmts = new_lines.split(';')
-
-    with cnx.cursor() as cursor:
-        if statement == None:
-            for stmt in stmts:
-                if stmt.strip() != "":
-                    cursor.execute(stmt)
-                    results.append(cursor.fetchall())
-        else:
-            stmt = stmts[int(statement) - 1]
-            
-            if stmt.strip() != "":
-                if ordered:
-                    words = stmt.split()
-                    words_lower = []
-                    for w in words:
-                        words_lower.append(w.strip().lower())
-                    if 'order' in words_lower and 'by' in words_lower:
-                        cursor.execute(stmt)
-                        x = cursor.fetchall()
-                        results.append(x)
-                    else:
-                        results.append([('No order caluse in ordered query','')])
+    stmts = script_statements(filename)
+
+    if statement == None:
+        results = current_backend().execute(database, stmts)
+    else:
+        stmt = stmts[int(statement) - 1]
+        
+        if stmt.strip() != "":
+            if ordered:
+                words = stmt.split()
+                words_lower = []
+                for w in words:
+                    words_lower.append(w.strip().lower())
+                if 'order' in words_lower and 'by' in words_lower:
+                    results = current_backend().execute(database, [stmt])
                 else:
-                    cursor.execute(stmt)
-                    results.append(cursor.fetchall())
+                    results.append([('No order caluse in ordered query','')])
+            else:
+                results = current_backend().execute(database, [stmt])
 
-    cnx.close()
     return results
 
-def run_statement(timeout: float, database:str, statement:str):
-    cnx = mysql.connector.connect(user='root', password='',
-                              host='127.0.0.1',
-                              database=database)
+# setup and cleanup scripts (content hash -> statements, with inserts merged)
+BULK_SCRIPTS: Dict[str, List[str]] = {}
+
+INSERT_VALUES = re.compile(r'(INSERT\s+INTO\s+[^\s(]+\s*(?:\([^)]*\)\s*)?VALUES)\s*(\(.*\))', re.IGNORECASE | re.DOTALL)
+# a run of anything but quotes, parentheses and commas, a quoted string or name, or any other character
+VALUES_TOKEN = re.compile(r"[^'\"`(),]+|'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`(?:[^`]|``)*`|.", re.DOTALL)
+
+def values_rows(values: str) -> Optional[List[str]]:
+    '''
+    the rows of a VALUES list, e.g. "(1, 'a'), (2, 'b')" -> ["(1, 'a')", "(2, 'b')"],
+    or None if there is anything else after VALUES (e.g. AS alias, or ON DUPLICATE KEY UPDATE).
+    '''
+    rows: List[str] = []
+    depth = 0
+    start = 0
+    # a row ended, and no comma came after it yet
+    after_row = False
+    for token in VALUES_TOKEN.finditer(values):
+        text = token.group()
+        if depth > 0:
+            if text == '(':
+                depth += 1
+            elif text == ')':
+                depth -= 1
+                if depth == 0:
+                    rows.append(values[start:token.end()])
+                    after_row = True
+        elif text == '(' and not after_row:
+            depth = 1
+            start = token.start()
+        elif text == ',' and after_row:
+            after_row = False
+        elif not text.isspace():
+            return None
+    if depth > 0 or not after_row:
+        return None
+    return rows
 
+def merge_inserts(statements: List[str]) -> List[str]:
+    '''
+    merge runs of INSERT ... VALUES statements into the same table (and columns) into multi-row inserts.
+    '''
+    merged: List[str] = []
+    prefix = ''
+    rows: List[str] = []
+    for statement in statements + ['']:
+        match = INSERT_VALUES.fullmatch(statement)
+        values = values_rows(match.group(2)) if match else None
+        if values is None:
+            match = None
+        same_prefix = match is not None and ' '.join(match.group(1).split()) == ' '.join(prefix.split())
+        if rows and (not same_prefix or len(rows) == SQL_BULK_INSERT_ROWS):
+            merged.append(f'{prefix} {", ".join(rows)}')
+            rows = []
+        if match and values is not None:
+            prefix = match.group(1)
+            rows.extend(values)
+        elif statement:
+            merged.append(statement)
+    return merged
+
+def bulk_statements(filename: str) -> List[str]:
+    key = file_hash(filename)
+    if key not in BULK_SCRIPTS:
+        BULK_SCRIPTS[key] = merge_inserts(script_statements(filename))
+    return BULK_SCRIPTS[key]
+
+def run_bulk_script(filename: str) -> None:
+    '''
+    run a setup or cleanup script, whose results nobody looks at, as fast as possible:
+    inserts are merged, results are discarded, and everything is committed once at the end.
+    '''
+    current_backend().execute_bulk(bulk_statements(filename))
+
+def run_statement(timeout: float, database:str, statement:str):
     results = []
-    stmts = [statement]
 
-    with cnx.cursor() as cursor:
-        for stmt in stmts:
-            if stmt.strip() != "":
-                cursor.execute(stmt)
-                results.append(cursor.fetchall())
-    cnx.close()
+    if statement.strip() != "":
+        results = current_backend().execute(database, [statement])
 
     return results
 
+# setup script (content hash) -> [(database, template, database options)] for each database it creates,
+# or None if the script has to be replayed for every test
+SETUP_SNAPSHOTS: Dict[str, Optional[List[Tuple[str, str, str]]]] = {}
+
+def list_databases() -> List[str]:
+    with pooled_connection('') as cnx, cnx.cursor() as cursor:
+        cursor.execute('SHOW DATABASES')
+        return [row[0] for row in cursor.fetchall()]
+
+def database_options(database: str) -> str:
+    # e.g. " /*!40100 DEFAULT CHARACTER SET utf8mb4 ... */", to create a copy with the same defaults
+    with pooled_connection('') as cnx, cnx.cursor() as cursor:
+        cursor.execute(f'SHOW CREATE DATABASE `{database}`')
+        statement = cursor.fetchall()[0][1]
+    return statement[statement.index(f'`{database}`') + len(database) + 2:]
+
+def has_uncopyable_objects(databases: List[str]) -> bool:
+    # views, triggers, and routines would have to be re-created with their definers, so don't bother
+    placeholders = ', '.join(['%s'] * len(databases))
+    queries = [
+        f'SELECT COUNT(*) FROM information_schema.VIEWS WHERE TABLE_SCHEMA IN ({placeholders})',
+        f'SELECT COUNT(*) FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA IN ({placeholders})',
+        f'SELECT COUNT(*) FROM information_schema.ROUTINES WHERE ROUTINE_SCHEMA IN ({placeholders})',
+        f'SELECT COUNT(*) FROM information_schema.EVENTS WHERE EVENT_SCHEMA IN ({placeholders})'
+    ]
+    with pooled_connection('') as cnx, cnx.cursor() as cursor:
+        for query in queries:
+            cursor.execute(query, databases)
+            if cursor.fetchall()[0][0] > 0:
+                return True
+    return False
+
+def copy_database(source: str, destination: str, options: str) -> None:
+    '''
+    replace the destination database with a copy of the tables (and rows) of the source database.
+    '''
+    with pooled_connection('') as cnx, cnx.cursor() as cursor:
+        cursor.execute(f'DROP DATABASE IF EXISTS `{destination}`')
+        cursor.execute(f'CREATE DATABASE `{destination}`{options}')
+        cursor.execute(f'USE `{destination}`')
+        # tables are created (and filled) in any order
+        cursor.execute('SET FOREIGN_KEY_CHECKS = 0')
+        cursor.execute(f"SHOW FULL TABLES FROM `{source}` WHERE Table_type = 'BASE TABLE'")
+        tables = [row[0] for row in cursor.fetchall()]
+        for table in tables:
+            cursor.execute(f'SHOW CREATE TABLE `{source}`.`{table}`')
+            cursor.execute(cursor.fetchall()[0][1])
+            cursor.execute(f'INSERT INTO `{table}` SELECT * FROM `{source}`.`{table}`')
+        cursor.execute('SET FOREIGN_KEY_CHECKS = 1')
+        cnx.commit()
+
+def drop_databases(databases: List[str]) -> None:
+    with pooled_connection('') as cnx, cnx.cursor() as cursor:
+        for database in databases:
+            cursor.execute(f'DROP DATABASE IF EXISTS `{database}`')
+
+def take_snapshot(key: str, databases: List[str]) -> Optional[List[Tuple[str, str, str]]]:
+    '''
+    copy the databases created by a setup script into templates, which are copied (back) for later tests.
+    returns None if the databases can't be copied faithfully.
+    '''
+    if not databases or has_uncopyable_objects(databases):
+        return None
+    snapshot = []
+    try:
+        for index, database in enumerate(databases):
+            template = f'tpl_{key[:12]}_{index}{worker_suffix()}'
+            options = database_options(database)
+            snapshot.append((database, template, options))
+            copy_database(database, template, options)
+    except Exception:
+        drop_databases([template for _, template, _ in snapshot])
+        return None
+    if not any(SETUP_SNAPSHOTS.values()):
+        # the first templates of this process (atexit doesn't run in worker processes, but this does)
+        Finalize(None, drop_snapshots, exitpriority=0)
+    return snapshot
+
+def load_setup(timeout: float, filename: str) -> None:
+    '''
+    run a setup script: the first time, for real (and snapshot what it creates);
+    after that, by copying the snapshot.
+    '''
+    current_backend().load_setup(filename)
+
+def drop_snapshots() -> None:
+    templates = [template for snapshot in SETUP_SNAPSHOTS.values() if snapshot for _, template, _ in snapshot]
+    if templates:
+        try:
+            drop_databases(templates)
+        except Exception:
+            pass
+    SETUP_SNAPSHOTS.clear()
+
+def created_databases(filename: str) -> List[str]:
+    return [match.group(2) for match in map(DATABASE_STATEMENT.match, script_statements(filename))
+            if match and match.group(1).upper() == 'CREATE']
+
+class SqlBackend:
+    '''
+    where sql tests run.  each test runs on exactly one backend (see test_backend).
+    '''
+    def start(self) -> str:
+        '''
+        get ready to run tests. returns why tests can't run, or '' if they can.
+        '''
+        raise NotImplementedError
+
+    def execute(self, database: str, statements: List[str]) -> list:
+        '''
+        run statements (with database as the default database), returns the rows of each.
+        uncommitted changes are discarded afterwards.
+        '''
+        raise NotImplementedError
+
+    def execute_bulk(self, statements: List[str]) -> None:
+        '''
+        run statements whose results don't matter, and commit.
+        '''
+        raise NotImplementedError
+
+    def load_setup(self, filename: str) -> None:
+        '''
+        create the databases of a setup script.
+        '''
+        raise NotImplementedError
+
+class MySqlBackend(SqlBackend):
+    '''
+    the database server, shared by every test (and every worker, each with its own databases).
+    '''
+    def start(self) -> str:
+        return ensure_database()
+
+    def execute(self, database: str, statements: List[str]) -> list:
+        results = []
+        with pooled_connection(database) as cnx, cnx.cursor() as cursor:
+            for stmt in statements:
+                cursor.execute(to_worker(stmt))
+                results.append(cursor.fetchall())
+        return results
+
+    def execute_bulk(self, statements: List[str]) -> None:
+        with pooled_connection('') as cnx, cnx.cursor() as cursor:
+            for stmt in statements:
+                cursor.execute(to_worker(stmt))
+                if cursor.with_rows:
+                    cursor.fetchall()
+            cnx.commit()
+
+    def load_setup(self, filename: str) -> None:
+        key = file_hash(filename)
+        if key in SETUP_SNAPSHOTS:
+            snapshot = SETUP_SNAPSHOTS[key]
+            if snapshot is None:
+                self.execute_bulk(bulk_statements(filename))
+            else:
+                for database, template, options in snapshot:
+                    copy_database(template, database, options)
+            return
+        before = set(list_databases())
+        self.execute_bulk(bulk_statements(filename))
+        # only the ones it created (another worker may be creating its own copies at the same time)
+        created = {worker_database(database) for database in created_databases(filename)}
+        SETUP_SNAPSHOTS[key] = take_snapshot(key, sorted((set(list_databases()) - before) & created))
+
+SQLITE_DATABASE_COMMAND = re.compile(
+    r'(?:(CREATE|DROP)\s+(?:DATABASE|SCHEMA)\s+(IF\s+(?:NOT\s+)?EXISTS\s+)?|(USE)\s+)`?([A-Za-z0-9_$]+)`?', re.IGNORECASE)
+# statements that commit the current transaction in mysql
+IMPLICIT_COMMIT = re.compile(r'(CREATE|DROP|ALTER|TRUNCATE|RENAME)\b', re.IGNORECASE)
+
+class SqliteBackend(SqlBackend):
+    '''
+    in-memory sqlite databases in this process, one per (mysql) database.
+    CREATE DATABASE, DROP DATABASE, and USE are emulated; every other statement is up to sqlite.
+    '''
+    def __init__(self) -> None:
+        self.databases: Dict[str, sqlite3.Connection] = {}
+        # setup script (content hash) -> {database: template}, or None if it has to be replayed
+        self.templates: Dict[str, Optional[Dict[str, sqlite3.Connection]]] = {}
+
+    def start(self) -> str:
+        return ''
+
+    def new_database(self) -> sqlite3.Connection:
+        cnx = sqlite3.connect(':memory:')
+        cnx.execute('PRAGMA foreign_keys = ON')
+        return cnx
+
+    def copy(self, source: sqlite3.Connection) -> sqlite3.Connection:
+        destination = self.new_database()
+        source.backup(destination)
+        return destination
+
+    def connection(self, database: str) -> sqlite3.Connection:
+        if not database:
+            raise sqlite3.OperationalError('No database selected')
+        if database.lower() not in self.databases:
+            raise sqlite3.OperationalError(f"Unknown database '{database}'")
+        return self.databases[database.lower()]
+
+    def database_command(self, command: re.Match, database: str) -> str:
+        # returns the (new) default database
+        verb, if_clause, use, name = command.groups()
+        exists = name.lower() in self.databases
+        if use:
+            self.connection(name)
+            return name
+        if verb.upper() == 'CREATE':
+            if exists and not if_clause:
+                raise sqlite3.OperationalError(f"Can't create database '{name}'; database exists")
+            if not exists:
+                self.databases[name.lower()] = self.new_database()
+            return database
+        if not exists and not if_clause:
+            raise sqlite3.OperationalError(f"Can't drop database '{name}'; database doesn't exist")
+        if exists:
+            self.databases.pop(name.lower()).close()
+        return '' if database.lower() == name.lower() else database
+
+    def run(self, database: str, statements: List[str], commit: bool) -> list:
+        results = []
+        succeeded = False
+        try:
+            for stmt in statements:
+                command = SQLITE_DATABASE_COMMAND.match(stmt)
+                if command:
+                    database = self.database_command(command, database)
+                    results.append([])
+                    continue
+                cnx = self.connection(database)
+                if IMPLICIT_COMMIT.match(stmt):
+                    cnx.commit()
+                results.append(cnx.execute(stmt).fetchall())
+            succeeded = True
+        finally:
+            for cnx in self.databases.values():
+                if commit and succeeded:
+                    cnx.commit()
+                else:
+                    cnx.rollback()
+        return results
+
+    def execute(self, database: str, statements: List[str]) -> list:
+        return self.run(database, statements, commit=False)
+
+    def execute_bulk(self, statements: List[str]) -> None:
+        self.run('', statements, commit=True)
+
+    def load_setup(self, filename: str) -> None:
+        key = file_hash(filename)
+        if key in self.templates:
+            templates = self.templates[key]
+            if templates is None:
+                self.execute_bulk(bulk_statements(filename))
+            else:
+                for database, template in templates.items():
+                    self.databases[database] = self.copy(template)
+            return
+        self.execute_bulk(bulk_statements(filename))
+        created = [database.lower() for database in created_databases(filename)]
+        if created and all(database in self.databases for database in created):
+            self.templates[key] = {database: self.copy(self.databases[database]) for database in created}
+        else:
+            self.templates[key] = None
+
+BACKENDS: Dict[str, SqlBackend] = {
+    'mysql': MySqlBackend(),
+    'sqlite': SqliteBackend()
+}
+
+# test types that only use portable sql (the others query mysql's catalog or rely on its error codes)
+PORTABLE_TEST_TYPES = ('sql', 'table_populate')
+
+# the backend of the test that is running
+CURRENT_BACKEND: Dict[str, SqlBackend] = {'backend': BACKENDS['mysql']}
+
+def test_backend(test_details) -> str:
+    '''
+    the name of the backend a test runs on: 'backend' in the test, or else SQL_BACKEND,
+    unless the test needs mysql.
+    '''
+    if test_details['type'] not in PORTABLE_TEST_TYPES:
+        return 'mysql'
+    return test_details.get('backend', SQL_BACKEND).lower()
+
+def current_backend() -> SqlBackend:
+    return CURRENT_BACKEND['backend']
+
+def start_backends(tests: List[Attributes]) -> None:
+    '''
+    start the backends that tests will need.
+    '''
+    for name in sorted({test_backend(parse_test(test)) for test in tests}):
+        if name in BACKENDS:
+            BACKENDS[name].start()
+
 def result_to_set(list_of_list_of_tuples_of_strings, ordered = False):
     results = []
     for list_of_tuples_of_strings in list_of_list_of_tuples_of_strings:
@@ -146,15 +803,65 @@ def run_scripts(timeout: float, scripts, test_details, override_db = None):
                 results = results + run_script(timeout, override_db , t.strip())
         return results
 
+# results of solution scripts, keyed by solution_key()
+SOLUTION_RESULTS: Dict[str, list] = {}
+
+def solution_key(test_details) -> str:
+    # everything the results of a solution depend on
+    digest = sha256()
+    for filename in [test_details['setup']] + test_details['solution'].split(','):
+        digest.update(file_hash(filename.strip()).encode('utf-8') + b'\0')
+    for detail in ('statement', 'ordered', 'database'):
+        digest.update(str(test_details.get(detail, '')).encode('utf-8') + b'\0')
+    digest.update(test_backend(test_details).encode('utf-8'))
+    return digest.hexdigest()
+
+def load_solution_results(key: str, ordered: bool) -> Optional[list]:
+    if not SQL_SOLUTION_CACHE_DIR:
+        return None
+    try:
+        with open(path_join(SQL_SOLUTION_CACHE_DIR, f'{key}.json'), 'r', encoding='utf-8') as file:
+            results = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return results if ordered else [set(result) for result in results]
+
+def store_solution_results(key: str, results: list) -> None:
+    if not SQL_SOLUTION_CACHE_DIR:
+        return
+    filename = path_join(SQL_SOLUTION_CACHE_DIR, f'{key}.json')
+    try:
+        makedirs(SQL_SOLUTION_CACHE_DIR, exist_ok=True)
+        with open(f'{filename}.tmp', 'wt', encoding='utf-8') as file:
+            json.dump([sorted(result) if isinstance(result, set) else result for result in results], file)
+        replace(f'{filename}.tmp', filename)
+    except OSError:
+        pass  # not fatal, it's only a cache
+
+def solution_results(timeout: float, test_details) -> list:
+    '''
+    the results of the solution scripts, which are the same for every test (and submission)
+    with the same setup, solution, statement, ordering, and database.
+    the setup must already be loaded, in case the solution has to be run.
+    '''
+    key = solution_key(test_details)
+    if key not in SOLUTION_RESULTS:
+        expected = load_solution_results(key, test_details['ordered'])
+        if expected is None:
+            expected = run_scripts(timeout, test_details['solution'] , test_details)
+            expected = result_to_set(expected, test_details["ordered"])
+            store_solution_results(key, expected)
+        SOLUTION_RESULTS[key] = expected
+    return SOLUTION_RESULTS[key]
+
 def run_sql_test(timeout: float, test: Attributes, test_details) -> Tuple[bool,str]:
     try:
         # run setup
-        run_script(timeout, '', test_details['setup'])
+        load_setup(timeout, test_details['setup'])
 
         # run solution before student corrupts data.
         if 'solution' in test_details.keys():
-            expected = run_scripts(timeout, test_details['solution'] , test_details)
-            expected = result_to_set(expected, test_details["ordered"]) 
+            expected = solution_results(timeout, test_details)
         
         # run student
         
@@ -182,11 +889,11 @@ def run_sql_test(timeout: float, test: Attributes, test_details) -> Tuple[bool,s
 
 def run_table_populate_test(timeout: float, test: Attributes, test_details) -> Tuple[bool,str]:
     try:
-        run_script(timeout, '', test_details['setup'])
+        load_setup(timeout, test_details['setup'])
         run_scripts (timeout, test['target'], test_details)
         actual = run_statement(timeout, test_details['database'] , "Select * from " + test_details['tablename'] + ";")
         
-        run_script(timeout, '', test_details['setup_sol'])
+        load_setup(timeout, test_details['setup_sol'])
         expected = run_statement(timeout, test_details['database_sol'] , "Select * from " + test_details['tablename_sol'] + ";")
 
         actual = result_to_set(actual)
@@ -216,7 +923,7 @@ def run_db_name_test(timeout: float, test: Attributes, test_details) -> Tuple[bo
         result = run_statement(timeout, '', 'show databases;')
 
         for x in result[0]:
-            if x[0].lower().strip() == test_details['database'].lower().strip() :
+            if x[0].lower().strip() == worker_database(test_details['database']).lower().strip() :
                 return True, ''
 
         return False, 'database ' + test_details['database'] + ' not created.'
@@ -226,7 +933,7 @@ def run_db_name_test(timeout: float, test: Attributes, test_details) -> Tuple[bo
 def run_table_exists_test(timeout: float, test: Attributes, test_details) -> Tuple[bool,str]:
     try:
         if 'setup' in test_details.keys():
-            run_script(timeout, '', test_details['setup'])   
+            load_setup(timeout, test_details['setup'])   
 
         run_scripts (timeout, test['target'], test_details, override_db = "")
         result = run_statement(timeout, test_details['database'], 'show tables;')
@@ -251,7 +958,7 @@ def make_set(l, column_no = None):
 def run_table_column_names_test(timeout: float, test: Attributes, test_details) -> Tuple[bool,str]:
     try:
         if 'setup' in test_details.keys():
-            run_script(timeout, '', test_details['setup'])            
+            load_setup(timeout, test_details['setup'])            
 
         run_scripts (timeout, test['target'], test_details, override_db = "")
         result = run_statement(timeout, test_details['database'], 'describe ' + test_details['tablename'].upper() + ';')
@@ -270,11 +977,11 @@ def run_table_column_names_test(timeout: float, test: Attributes, test_details)
 def run_table_primary_key_test(timeout: float, test: Attributes, test_details) -> Tuple[bool,str]:
     try:
         if 'setup' in test_details.keys():
-            run_script(timeout, '', test_details['setup'])   
+            load_setup(timeout, test_details['setup'])   
 
         run_scripts (timeout, test['target'], test_details, override_db = "")
         stmt =  "SELECT COLUMN_NAME FROM KEY_COLUMN_USAGE " + \
-                "WHERE TABLE_SCHEMA = '" + test_details['database'] + "' " + \
+                "WHERE TABLE_SCHEMA = '" + worker_database(test_details['database']) + "' " + \
                 "AND TABLE_NAME = '" + test_details['tablename'].upper() + "' " + \
                 "AND CONSTRAINT_NAME = 'PRIMARY';" 
         result = run_statement(timeout, 'information_schema', stmt)
@@ -293,11 +1000,11 @@ def run_table_primary_key_test(timeout: float, test: Attributes, test_details) -
 def run_table_foreign_key_test(timeout: float, test: Attributes, test_details) -> Tuple[bool,str]:
     try:
         if 'setup' in test_details.keys():
-            run_script(timeout, '', test_details['setup'])   
+            load_setup(timeout, test_details['setup'])   
 
         run_scripts (timeout, test['target'], test_details, override_db = "")
         stmt =  "SELECT REFERENCED_COLUMN_NAME FROM KEY_COLUMN_USAGE " + \
-                "WHERE TABLE_SCHEMA = '" + test_details['database'] + "' " + \
+                "WHERE TABLE_SCHEMA = '" + worker_database(test_details['database']) + "' " + \
                 "AND TABLE_NAME = '" + test_details['tablename'].upper() + "' " + \
                 "AND referenced_table_name = '" + test_details['referenced_table'].upper() + "' "\
                 "AND COLUMN_NAME = '" + test_details['columns'].upper().strip() + "';" 
@@ -318,7 +1025,7 @@ def run_table_foreign_key_test(timeout: float, test: Attributes, test_details) -
 def run_table_check_constraint_test(timeout: float, test: Attributes, test_details) -> Tuple[bool,str]:
     try:
         if 'setup' in test_details.keys():
-            run_script(timeout, '', test_details['setup'])   
+            load_setup(timeout, test_details['setup'])   
             
         run_scripts (timeout, test['target'], test_details, override_db= "")
 
@@ -354,20 +1061,21 @@ def run_test(test: Attributes) -> PartialTestResult:
     timeout = float(test['timeout'])
     time_start = time()
 
-    # start db
-    run_cmd = ["service", "mysql", "start"]
-    p = subprocess.Popen(run_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    try:
-        _, output_err = p.communicate(timeout=timeout)
-        output = output_err.decode('utf-8')
-    except Exception as e:
-        output = str(e)
-        exit("DB failed to start 2")
-
     # Actual running starts here 
     test_details = parse_test(test)
+    register_databases([test_details.get('database', ''), test_details.get('database_sol', '')])
+
+    # start db (once)
+    backend = test_backend(test_details)
+    if backend in BACKENDS:
+        CURRENT_BACKEND['backend'] = BACKENDS[backend]
+        database_error = current_backend().start()
+    else:
+        database_error = f'unsupported sql backend: {backend}\n'
 
-    if test_details['type'] == 'sql':
+    if database_error:
+        runs, run_output = False, database_error
+    elif test_details['type'] == 'sql':
         runs, run_output = run_sql_test(timeout, test, test_details)
     elif test_details['type'] == 'db_name':
         runs, run_output = run_db_name_test(timeout, test, test_details)
@@ -389,7 +1097,8 @@ def run_test(test: Attributes) -> PartialTestResult:
     time_end = time()
     run_time = time_end - time_start
 
-    run_script(timeout, '', 'cleanup.sql')
+    if not database_error:
+        run_bulk_script('cleanup.sql')
 
     if runs:
         if point_multiplier < 100.0:
@@ -402,7 +1111,7 @@ def run_test(test: Attributes) -> PartialTestResult:
         points = 0
 
     result: PartialTestResult = {
-        'run_output': run_output,
+        'run_output': from_worker(run_output),
         'unapproved_includes': unapproved_includes,
         'sufficient_coverage': sufficient_coverage,
         'points': points,
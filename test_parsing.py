@@ -2,22 +2,57 @@
 Methods for parsing test specifications.
 '''
 
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
 from dataclasses import dataclass
+from contextlib import redirect_stdout
+from io import StringIO
+from os import makedirs, replace
+from os.path import abspath, dirname, exists as path_exists, getsize, isfile, join as path_join
+import json
 from attributes import Attributes
-from config import BEGIN_MULTILINE_COMMENT_DELIMITER, BEGIN_TEST_DELIMITER, DEFAULT_NUMBER,\
+from compile_cache import file_hash
+from config import BEGIN_MULTILINE_COMMENT_DELIMITER, BEGIN_TEST_DELIMITER, DEFAULT_COMPARE, DEFAULT_NUMBER,\
     DEFAULT_POINTS, DEFAULT_SHOW_OUTPUT, DEFAULT_TARGET, DEFAULT_TIMEOUT, DEFAULT_VISIBILITY,\
-    EMPTY_TEST_BLOCK, END_MULTILINE_COMMENT_DELIMITER, END_TEST_DELIMITER, VISIBILITY_OPTIONS
+    EMPTY_TEST_BLOCK, END_MULTILINE_COMMENT_DELIMITER, END_TEST_DELIMITER, MAX_FIXTURE_BYTES,\
+    TEST_PLAN_CACHE_DIR, VISIBILITY_OPTIONS
+from output_comparison import check_expected_output, parse_comparison
+
+# changing the parser (or its configuration) invalidates cached test plans
+PARSER_FILES = [path_join(dirname(abspath(__file__)), name) for name in (
+    'test_parsing.py', 'attributes.py', 'config.py', 'output_comparison.py')]
 
 
 @dataclass
 class FilePosition:
     '''
-    Stores file contents with position
+    Stores file contents with position.
+    blank lines are left out, and end-of-line whitespace is removed, when the file is read.
     '''
     index: int
     lines: List[str]
     filename: str
+    # line number (in the file) of each line
+    line_numbers: List[int]
+
+    def line_number(self) -> int:
+        '''
+        line number (in the file) of the current line.
+        '''
+        return self.line_numbers[min(self.index, len(self.lines) - 1)]
+
+def read_lines(filename: str) -> FilePosition:
+    '''
+    read the non-blank lines of a file, in one pass.
+    '''
+    lines: List[str] = []
+    line_numbers: List[int] = []
+    with open(filename, encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.rstrip()
+            if line:
+                lines.append(line)
+                line_numbers.append(line_number)
+    return FilePosition(0, lines, filename, line_numbers)
 
 def unexpected_end_of_input(file_pos: FilePosition) -> SyntaxError:
     '''
@@ -26,28 +61,30 @@ def unexpected_end_of_input(file_pos: FilePosition) -> SyntaxError:
     # filename lineno offset text
     return SyntaxError(
         'unexpected end of input',
-        (file_pos.filename, file_pos.index+1, 1, file_pos.lines[file_pos.index]))
+        (file_pos.filename, file_pos.line_number(), 1, file_pos.lines[-1]))
 
 def goto_next_line(file_pos: FilePosition) -> str:
     '''
-    go to the next non-blank line.
+    go to the next (non-blank) line.
     '''
     file_pos.index += 1
     if file_pos.index >= len(file_pos.lines):
         raise unexpected_end_of_input(file_pos)
 
-    # skip blank lines
-    skip_blank_lines(file_pos)
-    line = file_pos.lines[file_pos.index].rstrip()
+    return file_pos.lines[file_pos.index]
 
-    return line
-
-def skip_blank_lines(file_pos: FilePosition) -> None:
+def goto_end_of_test_block(file_pos: FilePosition) -> int:
     '''
-    skip blank lines.
+    go to the next end of test block delimiter.
+    returns the index of the line after the current one, i.e. the start of the test body.
     '''
-    while file_pos.index < len(file_pos.lines) and not file_pos.lines[file_pos.index].rstrip():
-        file_pos.index += 1
+    start = file_pos.index + 1
+    try:
+        file_pos.index = file_pos.lines.index(END_TEST_DELIMITER, start)
+    except ValueError as exc:
+        file_pos.index = len(file_pos.lines)
+        raise unexpected_end_of_input(file_pos) from exc
+    return start
 
 def eat_block_of_test(file_pos: FilePosition) -> str:
     '''
@@ -64,14 +101,12 @@ def eat_block_of_test(file_pos: FilePosition) -> str:
         # filename lineno offset text
         raise SyntaxError(
             f'missing expected start of test block: "{BEGIN_TEST_DELIMITER}"',
-            (file_pos.filename, file_pos.index+1, 1, line))
+            (file_pos.filename, file_pos.line_number(), 1, line))
 
     # eat until end of test block
-    while line != END_TEST_DELIMITER:
-        # go to next line
-        line = goto_next_line(file_pos)
+    goto_end_of_test_block(file_pos)
 
-    return line
+    return END_TEST_DELIMITER
 
 def eat_empty_test_block(file_pos: FilePosition) -> str:
     '''
@@ -86,14 +121,14 @@ def eat_empty_test_block(file_pos: FilePosition) -> str:
         if line != END_TEST_DELIMITER:
             raise SyntaxError(
                 f'expected end of test: "{END_TEST_DELIMITER}"',
-                (file_pos.filename, file_pos.index+1, 1, line))
+                (file_pos.filename, file_pos.line_number(), 1, line))
         return line
 
     if line != EMPTY_TEST_BLOCK:
         # filename lineno offset text
         raise SyntaxError(
             f'expected empty test block: "{EMPTY_TEST_BLOCK}"',
-            (file_pos.filename, file_pos.index+1, 1, line))
+            (file_pos.filename, file_pos.line_number(), 1, line))
 
     return line
 
@@ -101,7 +136,7 @@ def current_line(file_pos: FilePosition) -> str:
     '''
     get the current line from the file position structure.
     '''
-    return file_pos.lines[file_pos.index].rstrip()
+    return file_pos.lines[file_pos.index]
 
 def expect_start_of_multiline_comment(file_pos: FilePosition) -> None:
     '''
@@ -113,7 +148,7 @@ def expect_start_of_multiline_comment(file_pos: FilePosition) -> None:
         # filename lineno offset text
         raise SyntaxError(
             f'missing expected start of multiline comment: "{BEGIN_MULTILINE_COMMENT_DELIMITER}"',
-            (file_pos.filename, file_pos.index+1, 1, line))
+            (file_pos.filename, file_pos.line_number(), 1, line))
 
 
 def expect_end_of_multiline_comment(file_pos: FilePosition) -> None:
@@ -126,7 +161,7 @@ def expect_end_of_multiline_comment(file_pos: FilePosition) -> None:
         # filename lineno offset text
         raise SyntaxError(
             f'missing expected end of multiline comment: "{END_MULTILINE_COMMENT_DELIMITER}"',
-            (file_pos.filename, file_pos.index+1, 1, line))
+            (file_pos.filename, file_pos.line_number(), 1, line))
 
 
 def read_annotations(file_pos: FilePosition) -> Dict[str, Any]:
@@ -136,7 +171,7 @@ def read_annotations(file_pos: FilePosition) -> Dict[str, Any]:
     expect_start_of_multiline_comment(file_pos)
 
     # go to next line
-    line = goto_next_line(file_pos).rstrip()
+    line = goto_next_line(file_pos)
 
     attr_dict: Dict[str, Any] = {}
     while line.startswith('@'):
@@ -145,13 +180,13 @@ def read_annotations(file_pos: FilePosition) -> Dict[str, Any]:
         except ValueError as exc:
             raise SyntaxError(
                 'missing attribute value? (attributes look like "@name: value")',
-                (file_pos.filename, file_pos.index+1, 1, line)) from exc
+                (file_pos.filename, file_pos.line_number(), 1, line)) from exc
         tag = tag.strip()[1:]
         value = value.strip()
         if tag in attr_dict:
             old_value = attr_dict[tag]
             print((
-                f'[WARNING] ({file_pos.filename}:{file_pos.index+1})'
+                f'[WARNING] ({file_pos.filename}:{file_pos.line_number()})'
                 f' tag "{tag}" already exists,'
                 f'old value will be overwritten: {old_value} --> {value}'))
         if tag == "points":
@@ -160,7 +195,7 @@ def read_annotations(file_pos: FilePosition) -> Dict[str, Any]:
                 points = float(value)
             except ValueError:
                 print((
-                    f'[WARNING] ({file_pos.filename}:{file_pos.index+1})'
+                    f'[WARNING] ({file_pos.filename}:{file_pos.line_number()})'
                     f' points attribute has invalid value ({value}),'
                     f' using default value ({DEFAULT_POINTS})'))
             attr_dict['points'] = points
@@ -172,7 +207,7 @@ def read_annotations(file_pos: FilePosition) -> Dict[str, Any]:
                     raise ValueError('timeout must be positive')
             except ValueError:
                 print((
-                    f'[WARNING] ({file_pos.filename}:{file_pos.index+1})'
+                    f'[WARNING] ({file_pos.filename}:{file_pos.line_number()})'
                     f' timeout attribute has invalid value ({value}),'
                     f' using default value ({DEFAULT_TIMEOUT})'))
             attr_dict['timeout'] = timeout
@@ -180,12 +215,23 @@ def read_annotations(file_pos: FilePosition) -> Dict[str, Any]:
             visibility = DEFAULT_VISIBILITY
             if value not in VISIBILITY_OPTIONS:
                 print((
-                    f'[WARNING] ({file_pos.filename}:{file_pos.index+1})'
+                    f'[WARNING] ({file_pos.filename}:{file_pos.line_number()})'
                     f' visibility attribute has invalid value ({value}),'
                     f' using default value ({DEFAULT_VISIBILITY})'))
             else:
                 visibility = value
             attr_dict['visibility'] = visibility
+        elif tag == 'compare':
+            compare = DEFAULT_COMPARE
+            try:
+                parse_comparison(value)
+                compare = value
+            except ValueError:
+                print((
+                    f'[WARNING] ({file_pos.filename}:{file_pos.line_number()})'
+                    f' compare attribute has invalid value ({value}),'
+                    f' using default value ({DEFAULT_COMPARE})'))
+            attr_dict['compare'] = compare
         else:
             attr_dict[tag] = value
 
@@ -214,12 +260,12 @@ def verify_required_annotations(annotations: Dict[str, Any], file_pos: FilePosit
         if attribute != 'target' or annotations['type'] not in exempt_types:
             if attribute not in annotations:
                 raise KeyError((
-                    f'({file_pos.filename}:{file_pos.index+1})'
+                    f'({file_pos.filename}:{file_pos.line_number()})'
                     f' missing required attribute: {attribute}'
                     f'\n{additonal_details}'))
             if annotations[attribute] == '':
                 raise ValueError((
-                    f'({file_pos.filename}:{file_pos.index+1})'
+                    f'({file_pos.filename}:{file_pos.line_number()})'
                     f' required attribute missing value: {attribute}'
                     f'\n{additonal_details}'))
 
@@ -258,12 +304,13 @@ def apply_default_annotations(annotations: Dict[str, Any]) -> None:
     if 'visibility' not in annotations:
         annotations['visibility'] = DEFAULT_VISIBILITY
 
+    if 'compare' not in annotations:
+        annotations['compare'] = DEFAULT_COMPARE
+
 def read_attributes(file_pos: FilePosition) -> Attributes:
     '''
     read, verify, andapply default values to test annotations.
     '''
-    # skip blank lines
-    skip_blank_lines(file_pos)
     attributes: Attributes = {
         'number': '',
         'name': '',
@@ -274,13 +321,15 @@ def read_attributes(file_pos: FilePosition) -> Attributes:
         'timeout': 0.0,
         'include': '',
         'code': '',
-        'expected_input':'',
-        'expected_output': '',
+        'input_file': '',
+        'output_file': '',
+        'script_file': '',
         'script_content': '',
         'approved_includes': [],
         'skip': False,
         'script_args': '',
-        'visibility': ''
+        'visibility': '',
+        'compare': ''
         }
     if file_pos.index >= len(file_pos.lines):
         # at end of file
@@ -300,6 +349,7 @@ def read_attributes(file_pos: FilePosition) -> Attributes:
     attributes['include'] = annotations['include']
     attributes['skip'] = annotations['skip']
     attributes['visibility'] = annotations['visibility']
+    attributes['compare'] = annotations['compare']
 
     return attributes
 
@@ -307,17 +357,8 @@ def read_block_of_test(file_pos: FilePosition) -> str:
     '''
     read lines until and end test body delimited is read
     '''
-    code = str()
-    got_code = True
-    while got_code:
-        line = goto_next_line(file_pos)
-
-        if line != END_TEST_DELIMITER:
-            code += line + '\n'
-        else:
-            got_code = False
-
-    return code
+    start = goto_end_of_test_block(file_pos)
+    return ''.join(line + '\n' for line in file_pos.lines[start:file_pos.index])
 
 def expect_start_of_test_block(file_pos: FilePosition) -> None:
     '''
@@ -329,7 +370,7 @@ def expect_start_of_test_block(file_pos: FilePosition) -> None:
         # filename lineno offset text
         raise SyntaxError(
             f'missing expected start of test block: "{BEGIN_TEST_DELIMITER}"',
-            (file_pos.filename, file_pos.index+1, 1, line))
+            (file_pos.filename, file_pos.line_number(), 1, line))
 
 
 def expect_end_of_test_block(file_pos: FilePosition) -> None:
@@ -341,7 +382,7 @@ def expect_end_of_test_block(file_pos: FilePosition) -> None:
         # filename lineno offset text
         raise SyntaxError(
             f'missing expected end of test block: "{END_TEST_DELIMITER}"',
-            (file_pos.filename, file_pos.index+1, 1, line))
+            (file_pos.filename, file_pos.line_number(), 1, line))
 
 
 def read_unit_test(file_pos: FilePosition) -> str:
@@ -355,9 +396,24 @@ def read_unit_test(file_pos: FilePosition) -> str:
     code = read_block_of_test(file_pos)
     return code
 
-def read_io_test(file_pos: FilePosition) -> Tuple[str, str]:
+def expect_fixture(kind: str, filename: str, file_pos: FilePosition, line: str) -> None:
     '''
-    read an i/o test.
+    throw a syntax error if an i/o fixture is missing or too large.
+    its contents are only read when the test runs.
+    '''
+    if not isfile(filename):
+        raise SyntaxError(
+            f'{kind} file not found: {filename}',
+            (file_pos.filename, file_pos.line_number(), 1, line))
+    if getsize(filename) > MAX_FIXTURE_BYTES:
+        raise SyntaxError(
+            f'{kind} file is larger than {MAX_FIXTURE_BYTES} bytes: {filename}',
+            (file_pos.filename, file_pos.line_number(), 1, line))
+
+def read_io_test(file_pos: FilePosition, compare: str, referenced_files: List[str]) -> Tuple[str, str]:
+    '''
+    read an i/o test, whose output is compared as compare (its @compare) says.
+    returns the names of the input and output files (which are added to referenced_files).
     '''
 
     expect_start_of_test_block(file_pos)
@@ -376,7 +432,7 @@ def read_io_test(file_pos: FilePosition) -> Tuple[str, str]:
             # filename lineno offset text
             raise SyntaxError(
                 'expected "tag: value" pair',
-                (file_pos.filename, file_pos.index+1, 1, line)) from exc
+                (file_pos.filename, file_pos.line_number(), 1, line)) from exc
 
         tag = tag.strip()
         value = value.strip()
@@ -389,42 +445,36 @@ def read_io_test(file_pos: FilePosition) -> Tuple[str, str]:
             # filename lineno offset text
             raise SyntaxError(
                 f'unexpected tag ({tag}) in i/o test',
-                (file_pos.filename, file_pos.index+1, 1, line))
+                (file_pos.filename, file_pos.line_number(), 1, line))
 
     expect_end_of_test_block(file_pos)
 
     if not input_filename:
         raise SyntaxError(
             'missing output filename in i/o test',
-            (file_pos.filename, file_pos.index+1, 1, line))
+            (file_pos.filename, file_pos.line_number(), 1, line))
     if not output_filename:
         raise SyntaxError(
             'missing input filename in i/o test',
-            (file_pos.filename, file_pos.index+1, 1, line))
-
-    expected_input = None
-    expected_output = None
-    try:
-        with open(input_filename, 'r', encoding='utf-8') as file:
-            expected_input = file.read()
-    except FileNotFoundError as exc:
-        raise SyntaxError(
-            f'input file not found: {input_filename}',
-            (file_pos.filename, file_pos.index+1, 1, line)) from exc
+            (file_pos.filename, file_pos.line_number(), 1, line))
 
+    referenced_files.extend([input_filename, output_filename])
+    expect_fixture('input', input_filename, file_pos, line)
+    expect_fixture('output', output_filename, file_pos, line)
     try:
-        with open(output_filename, 'r', encoding='utf-8') as file:
-            expected_output = file.read()
-    except FileNotFoundError as exc:
+        check_expected_output(compare, output_filename)
+    except ValueError as exc:
         raise SyntaxError(
-            f'output file not found: {output_filename}',
-            (file_pos.filename, file_pos.index+1, 1, line)) from exc
+            f'output file can not be compared with @compare: {compare}: {output_filename}: {exc}',
+            (file_pos.filename, file_pos.line_number(), 1, line)) from exc
 
-    return expected_input, expected_output
+    return input_filename, output_filename
 
-def read_script_test(file_pos: FilePosition) -> Tuple[str, str]:
+def read_script_test(file_pos: FilePosition, referenced_files: List[str]) -> Tuple[str, str]:
     '''
     read a script/custom test.
+    returns the script arguments and the name of the script (empty if it does not exist).
+    the name of the script is added to referenced_files, whether or not it exists.
     '''
 
     expect_start_of_test_block(file_pos)
@@ -433,11 +483,10 @@ def read_script_test(file_pos: FilePosition) -> Tuple[str, str]:
     line = goto_next_line(file_pos).strip()
     values = line.split(None, 1)
     script_args = str()
-    script_content = str()
     if len(values) == 0:
         raise SyntaxError(
             'missing expected name of script, e.g. scripts/example.sh',
-            (file_pos.filename, file_pos.index+1, 1, line))
+            (file_pos.filename, file_pos.line_number(), 1, line))
 
     if len(values) == 1:
         # does not have args (only script path)
@@ -451,13 +500,12 @@ def read_script_test(file_pos: FilePosition) -> Tuple[str, str]:
 
     expect_end_of_test_block(file_pos)
 
-    try:
-        with open(script_filename_string, 'rt', encoding='utf-8') as file:
-            script_content = file.read()
-    except FileNotFoundError:
+    referenced_files.append(script_filename_string)
+    if not isfile(script_filename_string):
         print(f'No such file or directory: \'{script_filename_string}\'')
+        return script_args, ''
 
-    return script_args, script_content
+    return script_args, script_filename_string
 
 def read_approved_includes(file_pos: FilePosition) -> List[str]:
     '''
@@ -466,13 +514,8 @@ def read_approved_includes(file_pos: FilePosition) -> List[str]:
 
     expect_start_of_test_block(file_pos)
 
-    # go to next line
-    line = goto_next_line(file_pos)
-
-    approved_includes: list[str] = []
-    while line != END_TEST_DELIMITER:
-        approved_includes.append(line)
-        line = goto_next_line(file_pos)
+    start = goto_end_of_test_block(file_pos)
+    approved_includes: list[str] = file_pos.lines[start:file_pos.index]
 
     return approved_includes
 
@@ -496,7 +539,7 @@ def read_coverage_test(file_pos: FilePosition) -> Tuple[str, List[str]]:
             # filename lineno offset text
             raise SyntaxError(
                 'expected "tag: value" pair',
-                (file_pos.filename, file_pos.index+1, 1, line)) from exc
+                (file_pos.filename, file_pos.line_number(), 1, line)) from exc
 
         tag = tag.strip()
 
@@ -508,7 +551,7 @@ def read_coverage_test(file_pos: FilePosition) -> Tuple[str, List[str]]:
             # filename lineno offset text
             raise SyntaxError(
                 f'unexpected tag ({tag}) in coverage test',
-                (file_pos.filename, file_pos.index+1, 1, line))
+                (file_pos.filename, file_pos.line_number(), 1, line))
 
         # go to next line
         line = goto_next_line(file_pos)
@@ -517,23 +560,86 @@ def read_coverage_test(file_pos: FilePosition) -> Tuple[str, List[str]]:
         # filename lineno offset text
         raise SyntaxError(
             'missing expected main and/or target in coverage test',
-            (file_pos.filename, file_pos.index+1, 1, line))
+            (file_pos.filename, file_pos.line_number(), 1, line))
 
     return main, source
 
 
-def read_tests(filename: str) -> List[Attributes]:
+def dependency_hash(filename: str) -> str:
+    return file_hash(filename) if path_exists(filename) else '-'
+
+def referenced_file_size(filename: str) -> int:
+    # the parser only looks at whether referenced files exist and how big they are
+    return getsize(filename) if isfile(filename) else -1
+
+def load_test_plan(plan_filename: str) -> Optional[List[Attributes]]:
     '''
-    read tests from file into a list.
+    load a cached test plan, if none of the files it was parsed from have changed.
     '''
-    with open(filename, encoding='utf-8') as file:
-        lines = file.readlines()
+    try:
+        with open(plan_filename, 'r', encoding='utf-8') as file:
+            plan = json.load(file)
+        if any(dependency_hash(filename) != digest for filename, digest in plan['dependencies'].items()):
+            return None
+        if any(referenced_file_size(filename) != size for filename, size in plan['referenced_files'].items()):
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    # same warnings as parsing would print
+    print(plan['output'], end='')
+    return plan['tests']
+
+def store_test_plan(
+        plan_filename: str,
+        tests: List[Attributes],
+        output: str,
+        dependencies: List[str],
+        referenced_files: List[str]) -> None:
+    '''
+    cache a test plan.
+    '''
+    plan = {
+        'dependencies': {filename: dependency_hash(filename) for filename in dependencies},
+        'referenced_files': {filename: referenced_file_size(filename) for filename in referenced_files},
+        'output': output,
+        'tests': tests
+    }
+    try:
+        makedirs(dirname(plan_filename), exist_ok=True)
+        with open(f'{plan_filename}.tmp', 'wt', encoding='utf-8') as file:
+            json.dump(plan, file, separators=(',', ':'))
+        replace(f'{plan_filename}.tmp', plan_filename)
+    except OSError:
+        pass  # not fatal, it's only a cache
 
-    # trim empty lines at end of file
-    while len(lines) > 0 and lines[-1].strip() == '':
-        del lines[-1]
+def read_tests(filename: str, cache_dir: str = TEST_PLAN_CACHE_DIR) -> List[Attributes]:
+    '''
+    read tests from file into a list.
+    if cache_dir is given, reuse the tests parsed by an earlier run, unless something changed.
+    '''
+    if not cache_dir:
+        return parse_tests(filename)
+
+    plan_filename = path_join(cache_dir, f'{file_hash(filename)}.json')
+    tests = load_test_plan(plan_filename)
+    if tests is None:
+        # files read while parsing (besides the test specification itself)
+        referenced_files: List[str] = []
+        output = StringIO()
+        with redirect_stdout(output):
+            tests = parse_tests(filename, referenced_files)
+        print(output.getvalue(), end='')
+        store_test_plan(plan_filename, tests, output.getvalue(), [filename] + PARSER_FILES, referenced_files)
+    return tests
 
-    file_pos = FilePosition(0, lines, filename)
+def parse_tests(filename: str, referenced_files: Optional[List[str]] = None) -> List[Attributes]:
+    '''
+    read tests from file into a list.
+    the other files that the tests refer to (e.g. i/o fixtures) are added to referenced_files.
+    '''
+    if referenced_files is None:
+        referenced_files = []
+    file_pos = read_lines(filename)
     tests: list[Attributes] = []
     while file_pos.index < len(file_pos.lines):
         # expect next lines to be only attributes and values
@@ -549,11 +655,11 @@ def read_tests(filename: str) -> List[Attributes]:
             tests.append(attributes)
 
         elif test_type == 'i/o':
-            attributes['expected_input'], attributes['expected_output'] = read_io_test(file_pos)
+            attributes['input_file'], attributes['output_file'] = read_io_test(file_pos, attributes['compare'], referenced_files)
             tests.append(attributes)
 
         elif test_type == 'script':
-            attributes['script_args'], attributes['script_content'] = read_script_test(file_pos)
+            attributes['script_args'], attributes['script_file'] = read_script_test(file_pos, referenced_files)
             tests.append(attributes)
 
         elif test_type in ('approved_includes', 'compile', 'memory_errors', 'style'):
@@ -0,0 +1,153 @@
+'''
+Selecting which tests to run.
+
+A selection is a comma-separated list of terms, and selects every test that matches any term:
+  '*'            all tests (except those marked @skip)
+  '5'            all tests numbered 5: 5[.1, 5.2, ...], 5[a, b, ...]
+  '5.2'          all tests numbered 5.2: 5.2[.1, 5.2.2, ...], 5.2[a, b, ...]
+  '3-5.1'        all tests numbered from 3 through 5.1 (including 5.1[.1, a, ...])
+  '6-', '-2'     all tests numbered 6 and up, 2 and down
+  'name=<glob>'  all tests whose name matches the glob, e.g. name=*insert*
+  'type=<glob>'  all tests whose type matches the glob, e.g. type=unit
+'''
+
+from bisect import bisect_left, bisect_right
+from fnmatch import fnmatchcase
+import re
+from typing import Dict, List, Set, Tuple
+from attributes import Attributes
+
+# a test number is a sequence of numbers (compared as numbers) and single other characters
+NUMBER_TOKEN = re.compile(r'[0-9]+|.', re.DOTALL)
+
+NumberKey = Tuple[Tuple[int, int | str], ...]
+
+def number_tokens(number: str) -> List[str]:
+    '''
+    split a test number into tokens, e.g. "5.12a" -> ["5", ".", "12", "a"].
+    '''
+    return NUMBER_TOKEN.findall(number)
+
+def is_numeric(token: str) -> bool:
+    '''
+    true if a token of a test number is a number.
+    '''
+    return '0' <= token[0] <= '9'
+
+def number_key(number: str) -> NumberKey:
+    '''
+    sort key for a test number, so that 5.9 < 5.10 < 5a < 6.
+    '''
+    return tuple((0, int(token)) if is_numeric(token) else (1, token) for token in number_tokens(number))
+
+class NumberTrie:
+    '''
+    Trie over the tokens of test numbers, for finding all the tests under a number.
+    '''
+    def __init__(self) -> None:
+        self.children: Dict[str, 'NumberTrie'] = {}
+        # indices of the tests with exactly this number
+        self.tests: List[int] = []
+
+    def insert(self, tokens: List[str], index: int) -> None:
+        '''
+        add a test to the trie.
+        '''
+        node = self
+        for token in tokens:
+            node = node.children.setdefault(token, NumberTrie())
+        node.tests.append(index)
+
+    def collect(self, selected: Set[int]) -> None:
+        '''
+        add the tests at and under this node to selected.
+        '''
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            selected.update(node.tests)
+            stack.extend(node.children.values())
+
+    def select(self, tokens: List[str], selected: Set[int]) -> None:
+        '''
+        add the tests numbered with the given tokens, or with them as a prefix, to selected.
+        after a prefix that ends with a digit, the next token can't be a digit (5 does not select 51).
+        '''
+        node = self
+        for token in tokens:
+            if token not in node.children:
+                return
+            node = node.children[token]
+        if not tokens or is_numeric(tokens[-1]):
+            node.collect(selected)
+            return
+        # as with a plain string prefix, 5. selects 5.a but not 5.2
+        selected.update(node.tests)
+        for token, child in node.children.items():
+            if not is_numeric(token):
+                child.collect(selected)
+
+class TestIndex:
+    '''
+    Index of tests by number, built once per run and used to apply a selection.
+    '''
+    def __init__(self, tests: List[Attributes]) -> None:
+        self.tests = tests
+        self.trie = NumberTrie()
+        for index, test in enumerate(tests):
+            self.trie.insert(number_tokens(test['number']), index)
+        # (sort key, index) of every test, for ranges
+        self.ordered = sorted((number_key(test['number']), index) for index, test in enumerate(tests))
+        self.keys = [key for key, _ in self.ordered]
+
+    def select_range(self, low: str, high: str, selected: Set[int]) -> None:
+        '''
+        add the tests numbered from low through high (and under high) to selected.
+        an empty bound means no bound, e.g. 6- is 6 and up.
+        '''
+        start = bisect_left(self.keys, number_key(low)) if low else 0
+        end = bisect_right(self.keys, number_key(high)) if high else len(self.keys)
+        selected.update(index for _, index in self.ordered[start:end])
+        if high:
+            self.trie.select(number_tokens(high), selected)
+
+    def select_term(self, term: str) -> Set[int]:
+        '''
+        indices of the tests selected by one term of a selection.
+        '''
+        selected: Set[int] = set()
+        field, separator, pattern = term.partition('=')
+        if separator:
+            field = field.strip()
+            pattern = pattern.strip()
+            if field == 'name':
+                values = [test['name'] for test in self.tests]
+            elif field == 'type':
+                values = [test['type'] for test in self.tests]
+            else:
+                raise ValueError(f'unknown test selection: {term} (expected name=<glob> or type=<glob>)')
+            selected.update(index for index, value in enumerate(values) if fnmatchcase(value, pattern))
+        elif '-' in term:
+            low, high = term.split('-', 1)
+            self.select_range(low.strip(), high.strip(), selected)
+        else:
+            self.trie.select(number_tokens(term), selected)
+        return selected
+
+    def select(self, selection: str) -> Set[int]:
+        '''
+        indices of the tests selected by a selection (see the top of this file).
+        '''
+        selected: Set[int] = set()
+        for term in selection.split(','):
+            term = term.strip()
+            if not term:
+                continue
+            if term == '*':
+                selected.update(index for index, test in enumerate(self.tests) if not test['skip'])
+                continue
+            matches = self.select_term(term)
+            if not matches:
+                print(f'[WARNING] no tests match selection: {term}')
+            selected |= matches
+        return selected
@@ -2,15 +2,21 @@
 
 code=( "$@" )
 
-if g++ -std=c++23 -pedantic-errors -g "${code[@]}" >> DEBUG 2>&1; then
-  if valgrind --leak-check=full --error-exitcode=1 ./a.out >> DEBUG 2>&1; then
-	  echo 100 > OUTPUT
-	  echo 'PASS: no memory errors detected' >> DEBUG
-  else
-	  echo 0 > OUTPUT
-	  echo 'FAIL: memory errors detected, e.g. memory leak, use after free, double free, uninitialized use, access out of bounds' >> DEBUG
-  fi
+# use the prebuilt executable, if the test runner gave us one
+if [ -n "$MEMORY_ERROR_TEST" ] && [ -x "$MEMORY_ERROR_TEST" ]; then
+  executable=$MEMORY_ERROR_TEST
+elif g++ -std=c++23 -pedantic-errors -g "${code[@]}" >> DEBUG 2>&1; then
+  executable=./a.out
 else
   echo 0 > OUTPUT
   echo "FAIL: compilation errors" >> DEBUG
+  exit 0
+fi
+
+if valgrind --leak-check=full --error-exitcode=1 "$executable" >> DEBUG 2>&1; then
+  echo 100 > OUTPUT
+  echo 'PASS: no memory errors detected' >> DEBUG
+else
+  echo 0 > OUTPUT
+  echo 'FAIL: memory errors detected, e.g. memory leak, use after free, double free, uninitialized use, access out of bounds' >> DEBUG
 fi
@@ -20,16 +20,29 @@ public class TestRunner {
     request = Request.classes(classes);
   }
 
-  public void run() throws Exception{
+  /**
+   * Run the tests without exiting.
+   *
+   * @return the failure messages, or null if all tests passed.
+   */
+  public String runTests() {
     Result r = core.run(request);
-    if (r.getFailureCount() != 0){
-      String message = "";
-      for (Failure failure : r.getFailures()){
-        message += failure.getMessage() + "\n";
-      }
+    if (r.getFailureCount() == 0) {
+      return null;
+    }
+    String message = "";
+    for (Failure failure : r.getFailures()){
+      message += failure.getMessage() + "\n";
+    }
+    return message;
+  }
+
+  public void run() throws Exception{
+    String message = runTests();
+    if (message != null){
       System.out.println(message);
       System.exit(1);
     }
-    
+
   }
-}
\ No newline at end of file
+}
@@ -0,0 +1,197 @@
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.IOException;
+import java.io.InputStream;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.net.URL;
+import java.net.URLClassLoader;
+import java.nio.charset.StandardCharsets;
+
+/**
+ * A long-lived JVM that runs tests on request, so the JVM and JUnit are only loaded once.
+ *
+ * <p>Each request is a line "junit|main class-name input-length max-output", followed by
+ * input-length bytes of standard input. Each response is a line "status output-length", followed
+ * by output-length bytes of standard output. Every request runs in a fresh class loader over the
+ * current directory, so it sees freshly compiled classes and fresh static state.
+ *
+ * <p>If the tests exit the JVM, the response is "EXIT output-length" (the exit status is the
+ * status of the process). If a request can't be served, the response is "FALLBACK 0". If a
+ * request prints more than max-output bytes, the response is "OVERFLOW 0", and the server exits
+ * (since the request can't be stopped any other way).
+ */
+public class TestServer {
+  private static final OutputStream RESPONSES =
+      new FileOutputStream(FileDescriptor.out);
+  private static final InputStream REQUESTS = System.in;
+  private static final PrintStream DISCARD = new PrintStream(OutputStream.nullOutputStream());
+
+  private static ByteArrayOutputStream captured = null;
+
+  /** Standard output of a request, which ends the server once there is too much of it. */
+  private static final class BoundedOutputStream extends ByteArrayOutputStream {
+    private final long limit;
+
+    BoundedOutputStream(long limit) {
+      this.limit = limit;
+    }
+
+    /**
+     * Exit if writing len more bytes would go over the limit.
+     *
+     * @param len number of bytes about to be written
+     */
+    private void checkLimit(int len) {
+      if (count + (long) len > limit) {
+        try {
+          respond("OVERFLOW", new byte[0]);
+        } catch (IOException e) {
+          // nobody to tell
+        }
+        // without the shutdown hook, which would respond again
+        Runtime.getRuntime().halt(1);
+      }
+    }
+
+    @Override
+    public synchronized void write(int b) {
+      checkLimit(1);
+      super.write(b);
+    }
+
+    @Override
+    public synchronized void write(byte[] b, int off, int len) {
+      checkLimit(len);
+      super.write(b, off, len);
+    }
+
+    @Override
+    public synchronized void writeBytes(byte[] b) {
+      checkLimit(b.length);
+      super.writeBytes(b);
+    }
+  }
+
+  /**
+   * Write a response.
+   *
+   * @param status exit status of the request (or EXIT, FALLBACK or OVERFLOW)
+   * @param output standard output of the request
+   * @throws IOException if the response can't be written
+   */
+  private static synchronized void respond(String status, byte[] output) throws IOException {
+    RESPONSES.write((status + " " + output.length + "\n").getBytes(StandardCharsets.UTF_8));
+    RESPONSES.write(output);
+    RESPONSES.flush();
+  }
+
+  /**
+   * Read a request header.
+   *
+   * @return the header, or null at the end of the requests
+   * @throws IOException if the header can't be read
+   */
+  private static String readHeader() throws IOException {
+    ByteArrayOutputStream header = new ByteArrayOutputStream();
+    int b = REQUESTS.read();
+    while (b != -1 && b != '\n') {
+      header.write(b);
+      b = REQUESTS.read();
+    }
+    if (b == -1) {
+      return null;
+    }
+    return header.toString(StandardCharsets.UTF_8);
+  }
+
+  /**
+   * Run one request.
+   *
+   * @param kind junit (run the tests in the class) or main (call main)
+   * @param className name of the class
+   * @return exit status
+   * @throws Exception if the request can't be served
+   */
+  private static int run(String kind, String className) throws Exception {
+    URL[] urls = {new File(".").toURI().toURL()};
+    try (URLClassLoader loader = new URLClassLoader(urls, TestServer.class.getClassLoader())) {
+      Thread.currentThread().setContextClassLoader(loader);
+      Class<?> testClass = loader.loadClass(className);
+      if (kind.equals("junit")) {
+        // same as TestRunner.run(), without exiting
+        Class<?> runnerClass = loader.loadClass("TestRunner");
+        Object runner =
+            runnerClass.getConstructor(Class[].class).newInstance((Object) new Class<?>[] {testClass});
+        String message = (String) runnerClass.getMethod("runTests").invoke(runner);
+        if (message != null) {
+          System.out.println(message);
+          return 1;
+        }
+        return 0;
+      }
+      try {
+        testClass.getMethod("main", String[].class).invoke(null, (Object) new String[0]);
+      } catch (InvocationTargetException e) {
+        // same as an uncaught exception in main
+        e.getCause().printStackTrace();
+        return 1;
+      }
+      return 0;
+    }
+  }
+
+  /**
+   * Entry point.
+   *
+   * @param args command line arguments
+   * @throws Exception if the requests can't be read
+   */
+  public static void main(String[] args) throws Exception {
+    Runtime.getRuntime().addShutdownHook(new Thread(() -> {
+      ByteArrayOutputStream output = captured;
+      if (output != null) {
+        System.out.flush();
+        try {
+          respond("EXIT", output.toByteArray());
+        } catch (IOException e) {
+          // nobody to tell
+        }
+      }
+    }));
+
+    String header = readHeader();
+    while (header != null) {
+      String[] fields = header.split(" ");
+      byte[] input = REQUESTS.readNBytes(Integer.parseInt(fields[2]));
+
+      ByteArrayOutputStream output = new BoundedOutputStream(Long.parseLong(fields[3]));
+      PrintStream out = new PrintStream(output, true, StandardCharsets.UTF_8);
+      captured = output;
+      System.setIn(new ByteArrayInputStream(input));
+      System.setOut(out);
+      System.setErr(DISCARD);
+      String status;
+      try {
+        status = Integer.toString(run(fields[0], fields[1]));
+      } catch (Throwable e) {
+        status = "FALLBACK";
+      }
+      out.flush();
+      captured = null;
+      System.setIn(REQUESTS);
+      System.setOut(DISCARD);
+
+      if (status.equals("FALLBACK")) {
+        respond(status, new byte[0]);
+      } else {
+        respond(status, output.toByteArray());
+      }
+      header = readHeader();
+    }
+  }
+}
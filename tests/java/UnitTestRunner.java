@@ -5,11 +5,12 @@ public class UnitTestRunner {
   /**
    * Entry point.
    *
-   * @param args command line arguments
+   * @param args command line arguments: the name of the test class (default UnitTest)
       * @throws Exception 
       */
      public static void main(String[] args) throws Exception {
-      TestRunner runner = new TestRunner(UnitTest.class);
+      String className = args.length > 0 ? args[0] : "UnitTest";
+      TestRunner runner = new TestRunner(Class.forName(className));
       runner.run();
   }
 }